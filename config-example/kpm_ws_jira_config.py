@@ -56,6 +56,9 @@ LOCAL_TRACKER   = 'jira'
 # Adjust for your project
 LOCAL_PROJECT   = 'KAN'
 LOCAL_ISSUETYPE = 'Task'
+# Secret for checking the signature of Jira webhooks, only used with
+# the --webhook-port option
+#JIRA_WEBHOOK_SECRET = 'webhooksecret'
 
 KPM_ATTRIBUTES = \
     ( jira_sync.Sync_Attribute_Check
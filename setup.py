@@ -42,11 +42,13 @@ setup \
     , platforms        = 'Any'
     , python_requires  = '>=3.7'
     , install_requires = ['rsclib', 'zeep', 'requests', 'requests-pkcs12']
+    , extras_require   = dict (streaming = ['requests-toolbelt'])
     , entry_points       = dict
         ( console_scripts =
             [ 'jirasync=trackersync.jirasync:main'
             , 'kpmwssync=trackersync.kpmwssync:main'
             , 'kpmwstest=trackersync.kpmwssync:wstest'
+            , 'kpmwsstub=trackersync.kpmwsstub:main'
             , 'pfiffsync=trackersync.pfiffsync:main'
             ]
         )
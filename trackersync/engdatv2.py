@@ -29,7 +29,9 @@ from __future__       import unicode_literals
 from __future__       import print_function
 from rsclib.autosuper import autosuper
 from datetime         import datetime
+from io               import BytesIO
 
+import re
 import sys
 
 """ This implements enough EDIFACT to generate and parse ENGDAT messages
@@ -315,7 +317,8 @@ class UNA (autosuper):
 
     def __init__ (self, bytes = b"UNA:+.? '"):
         self.from_bytes (bytes)
-        self.length = 9
+        self.length     = 9
+        self._tokenizer = None
     # end def __init__
 
     @property
@@ -338,6 +341,13 @@ class UNA (autosuper):
         return self.una [-1].encode ('ASCII')
     # end def segment_terminator
 
+    @property
+    def tokenizer (self):
+        if self._tokenizer is None:
+            self._tokenizer = Edifact_Tokenizer (self)
+        return self._tokenizer
+    # end def tokenizer
+
     def check (self):
         pass
     # end def check
@@ -363,10 +373,168 @@ class UNA (autosuper):
 
 # end class UNA
 
+class Edifact_Tokenizer (autosuper):
+    """ Split EDIFACT data into segments, elements and components in
+        a single pass. Delimiters are found with one regex scan which
+        also skips released (quoted) characters, no bytes are copied:
+        We return offsets into the given buffer (usually a memoryview).
+        For each segment we get a tuple (start, end, elements) where
+        end is the offset of the segment terminator and elements is a
+        list of elements (without the segment name), each a list of
+        components given as (start, end, released) tuples. The released
+        flag indicates that the component needs unquoting. Like with
+        iterparts an empty part after the last delimiter is dropped,
+        an empty element has no components.
+    >>> t = Edifact_Tokenizer (una)
+    >>> b = memoryview (b"ABC+1:?+2:+?'x+'DEF'")
+    >>> for start, end, elements in t.tokenize (b):
+    ...     print (start, end, elements)
+    0 15 [[(4, 5, False), (6, 9, True)], [(11, 14, True)]]
+    16 19 []
+    >>> t.decode (b, (6, 9, True), 'latin-1')
+    '+2'
+    >>> t.decode (b, (11, 14, True), 'latin-1')
+    "'x"
+    >>> t.components (memoryview (b'a::b:'), 0, 5)
+    [(0, 1, False), (2, 2, False), (3, 4, False)]
+    """
+
+    def __init__ (self, una):
+        rc               = re.escape (una.release_char)
+        self.element_sep = una.element_sep
+        self.pattern     = re.compile \
+            ( b'|'.join
+                ( ( b'(' + rc + b'.?)'
+                  , b'(' + re.escape (una.component_sep)      + b')'
+                  , b'(' + re.escape (una.element_sep)        + b')'
+                  , b'(' + re.escape (una.segment_terminator) + b')'
+                ) )
+            , re.DOTALL
+            )
+        self.release     = re.compile (rc + b'(.?)', re.DOTALL)
+    # end def __init__
+
+    def components (self, buf, start, end):
+        """ Component spans of a single element in buf [start:end]
+        """
+        comps    = []
+        cstart   = start
+        released = False
+        for m in self.pattern.finditer (buf, start, end):
+            if m.lastindex == 1:
+                released = True
+                continue
+            comps.append ((cstart, m.start (), released))
+            released = False
+            cstart   = m.start () + 1
+        comps.append ((cstart, end, released))
+        return self._element (comps)
+    # end def components
+
+    def decode (self, buf, span, encoding):
+        """ Materialize a component """
+        start, end, released = span
+        if released:
+            b = bytes (buf [start:end])
+            return self.release.sub (br'\1', b).decode (encoding)
+        return str (buf [start:end], encoding)
+    # end def decode
+
+    def tokenize (self, buf, offset = 0, final = True):
+        """ Segments in buf starting at offset, a trailing segment
+            without terminator is only returned if final is True.
+        """
+        l        = len (buf)
+        sstart   = cstart = offset
+        released = False
+        comps    = []
+        elements = []
+        for m in self.pattern.finditer (buf, offset):
+            k = m.lastindex
+            if k == 1:
+                released = True
+                continue
+            p = m.start ()
+            comps.append ((cstart, p, released))
+            released = False
+            cstart   = p + 1
+            if k == 2:
+                continue
+            elements.append (self._element (comps))
+            comps = []
+            if k == 3:
+                continue
+            yield self._segment (buf, sstart, p, elements)
+            elements = []
+            sstart   = cstart
+        if final and sstart < l:
+            comps.append ((cstart, l, released))
+            elements.append (self._element (comps))
+            yield self._segment (buf, sstart, l, elements)
+    # end def tokenize
+
+    def _element (self, comps):
+        if len (comps) == 1:
+            if comps [0][0] == comps [0][1]:
+                return []
+        elif comps [-1][0] == comps [-1][1]:
+            comps.pop ()
+        return comps
+    # end def _element
+
+    def elements (self, buf, start, end):
+        """ Element spans of buf [start:end], used for segments where
+            the name is not followed by an element separator
+        >>> t = Edifact_Tokenizer (una)
+        >>> t.elements (memoryview (b'a+b:c++'), 0, 7)
+        [[(0, 1, False)], [(2, 3, False), (4, 5, False)], [], []]
+        """
+        elements = []
+        comps    = []
+        cstart   = start
+        released = False
+        for m in self.pattern.finditer (buf, start, end):
+            k = m.lastindex
+            if k == 1:
+                released = True
+                continue
+            comps.append ((cstart, m.start (), released))
+            released = False
+            cstart   = m.start () + 1
+            if k == 3:
+                elements.append (self._element (comps))
+                comps = []
+        comps.append ((cstart, end, released))
+        elements.append (self._element (comps))
+        return elements
+    # end def elements
+
+    def _segment (self, buf, start, end, elements):
+        """ The name is the first three bytes of the segment, it must
+            be followed by an element separator unless the segment
+            consists of the name only.
+        """
+        sep  = self.element_sep
+        name = elements [0]
+        assert end - start == 3 or \
+            (end - start > 3 and buf [start + 3:start + 4] == sep)
+        if len (name) == 1 and name [0][1] - name [0][0] == 3:
+            del elements [0]
+        else:
+            elements = self.elements (buf, start + 4, end)
+        if elements and not elements [-1]:
+            elements.pop ()
+        return start, end, elements
+    # end def _segment
+
+# end class Edifact_Tokenizer
+
 # default una
 una = UNA ()
 
-class _Part_Iter (autosuper):
+class _Part_Iter (object):
+
+    __slots__ = ()
 
     def iterparts (self, bytes, delimiter):
         """ Iterate over parts delimited with delimiter taking
@@ -411,7 +579,71 @@ class _Part_Iter (autosuper):
 
 # end class _Part_Iter
 
-class Edifact_Message (_Part_Iter):
+class Edifact_Reader (autosuper):
+    """ Read EDIFACT segments from a binary file, segments are yielded
+        as soon as they are complete. We read at most bufsize bytes at
+        a time, only an incomplete segment at the end of the buffer is
+        carried over to the next read. The segments reference the
+        buffer they were read from, their elements are created lazily.
+        Whitespace at the end of the file is ignored.
+    >>> r = Edifact_Reader (BytesIO (msg1 + b'\\n'), bufsize = 16)
+    >>> [s.segment_name for s in r] [:5]
+    ['UNA', 'UNB', 'UNH', 'MID', 'SDE']
+    >>> r.una.release_char
+    b'?'
+    >>> r = Edifact_Reader (BytesIO (msg1), bufsize = 16)
+    >>> b''.join (s.to_bytes () for s in r) == msg1
+    True
+    """
+
+    def __init__ (self, f, encoding = 'latin-1', bufsize = 65536):
+        self.f        = f
+        self.encoding = encoding
+        self.bufsize  = bufsize
+        self.una      = una
+    # end def __init__
+
+    def __iter__ (self):
+        buf  = self.f.read (max (9, self.bufsize))
+        offs = 0
+        if buf.startswith (b'UNA'):
+            self.una = UNA (buf [:9])
+            offs     = 9
+            yield self.una
+        tokenizer = self.una.tokenizer
+        while buf:
+            chunk = self.f.read (self.bufsize)
+            if not chunk:
+                buf = buf.rstrip ()
+            view  = memoryview (buf)
+            final = not chunk
+            for start, end, elements in tokenizer.tokenize \
+                (view, offs, final):
+                yield self.segment (view, start, end, elements)
+                offs = end + 1
+            # Carry over incomplete segment at end of buffer
+            if not final and offs < len (buf):
+                chunk = buf [offs:] + chunk
+            buf  = chunk
+            offs = 0
+    # end def __iter__
+
+    def segment (self, buf, start, end, elements):
+        """ Create segment of the right class from tokens """
+        name = str (buf [start:start + 3], 'ASCII')
+        cls  = Edifact_Segment
+        if name in globals ():
+            cls = globals () [name]
+        return cls \
+            ( una      = self.una
+            , encoding = self.encoding
+            , tokens   = (buf, start, end, elements)
+            )
+    # end def segment
+
+# end class Edifact_Reader
+
+class Edifact_Message (_Part_Iter, autosuper):
     """
         An EDIFACT message can start with an una segment.
         This defines the markup characters in use.
@@ -429,18 +661,35 @@ class Edifact_Message (_Part_Iter):
     >>> m.to_bytes () == msg3
     True
     >>> m.check (skip_segment_check = True)
+    >>> m = Edifact_Message (file = BytesIO (msg1))
+    >>> m.to_bytes () == msg1
+    True
+    >>> [s.file_info.filename for s in m.segment_iter ('EFC')]
+    ['EINSPRITZANLAGE.IGS', 'CATIA.LAY (11-38 D)']
+
+    Empty elements of named segments get their default values:
+    >>> m = Edifact_Message (bytes = msg1.replace (b'UNB+UNOC:1+', b'UNB++'))
+    >>> m.to_bytes () == msg1
+    True
+    >>> m.check ()
     """
 
-    def __init__ (self, una = una, bytes = None, *segments):
+    def __init__ (self, una = una, bytes = None, *segments, file = None):
         self.una = una
         self.encoding = 'latin-1'
         self.uniq     = ('UNB', 'UNH', 'UNT', 'UNZ', 'MID', 'SDE', 'RDE', 'TOT')
         for u in self.uniq:
             setattr (self, u.lower (), None)
+        # Segments by segment name
+        self.segment_index = {}
         if bytes:
             self.from_bytes (bytes)
+        elif file is not None:
+            self.from_file (file)
         else:
             self.segments = list (segments)
+            for s in self.segments:
+                self.index_segment (s)
     # end def __init__
 
     def append_segment (self, segment):
@@ -450,6 +699,7 @@ class Edifact_Message (_Part_Iter):
                 raise ValueError ("Duplicate %s segment" % sn)
             setattr (self, sn.lower (), segment)
         self.segments.append (segment)
+        self.index_segment (segment)
     # end def append_segment
 
     def check (self, skip_segment_check = False):
@@ -472,29 +722,31 @@ class Edifact_Message (_Part_Iter):
     # end def check
 
     def from_bytes (self, bytes):
-        self.segments = []
-        offs = 0
-        if bytes.startswith (b'UNA'):
-            self.una = UNA (bytes [:9])
-            offs = 9
-            self.append_segment (self.una)
-        else:
-            self.una = una
-        t = self.una.segment_terminator
-        for b in self.iterparts (bytes [offs:], t):
-            name = b [:3].decode ('ASCII')
-            cls  = Edifact_Segment
-            e    = self.encoding
-            if name in globals ():
-                cls = globals () [name]
-            self.append_segment \
-                (cls (bytes = b + t, una = self.una, encoding = e))
+        # Read everything at once, BytesIO doesn't copy in that case
+        self.from_file (BytesIO (bytes), bufsize = len (bytes))
     # end def from_bytes
 
+    def from_file (self, f, bufsize = 65536):
+        """ Read message from binary file f """
+        self.segments = []
+        reader = Edifact_Reader \
+            (f, encoding = self.encoding, bufsize = bufsize)
+        for segment in reader:
+            self.append_segment (segment)
+        self.una = reader.una
+    # end def from_file
+
+    def index_segment (self, segment):
+        sn = segment.segment_name
+        self.segment_index.setdefault (sn, []).append (segment)
+    # end def index_segment
+
     def segment_iter (self, segment_name):
-        for s in self.segments:
-            if s.segment_name == segment_name:
-                yield s
+        """ Iterate over segments with the given name in message
+            order, segments must have been added with append_segment
+            or index_segment.
+        """
+        return iter (self.segment_index.get (segment_name, ()))
     # end def segment_iter
 
     def to_bytes (self):
@@ -502,6 +754,12 @@ class Edifact_Message (_Part_Iter):
         return s
     # end def to_bytes
 
+    def write (self, f):
+        """ Write message segment by segment to binary file f """
+        for p in self.segments:
+            f.write (p.to_bytes ())
+    # end def write
+
     def __str__ (self):
         r = []
         for s in self.segments:
@@ -539,6 +797,19 @@ class Engdat_Message (Edifact_Message):
     >>> for s in em.segment_iter ('EFC'):
     ...     brepr (s.to_bytes ())
     b"EFC+002:002.zip+NAT:PKZIP-Archive+OTH:Other+trackersync+INF+null'"
+
+    For many files append without finalizing and finalize once:
+    >>> em = Engdat_Message (** d)
+    >>> for k in range (3):
+    ...     em.append_efc (finalize = False)
+    >>> em.finalize ()
+    >>> em.tot.quantity.quantity, em.unt.number_of_segments.segments
+    ('4', '11')
+    >>> from io import BytesIO
+    >>> f = BytesIO ()
+    >>> em.write (f)
+    >>> f.getvalue () == em.to_bytes ()
+    True
     """
 
     def __init__ \
@@ -657,7 +928,12 @@ class Engdat_Message (Edifact_Message):
         self.append_segment (unz)
     # end def __init__
 
-    def append_efc (self):
+    def append_efc (self, finalize = True):
+        """ Append an EFC segment before the TOT segment. When adding
+            many files call this with finalize = False and call
+            finalize once at the end, updating counts and checking the
+            message for each EFC would be quadratic.
+        """
         # We add one .zip file, if something different is needed this
         # has to be change in the user of this class. Some of these
         # values should probably be in the defaults.
@@ -678,21 +954,112 @@ class Engdat_Message (Edifact_Message):
             if s.segment_name == 'TOT':
                 break
         self.segments.insert (-(n + 1), efc)
+        self.index_segment (efc)
+        if finalize:
+            self.finalize ()
+    # end def append_efc
+
+    def finalize (self):
+        """ Update TOT and UNT counts and check the message """
         self.tot.quantity.quantity = str (self.seqno)
         self.unt.number_of_segments.segments = str (len (self.segments))
         self.check ()
-    # end def append_efc
+    # end def finalize
 
 # end class Engdat_Message
 
+def _component_property (idx, name):
+    """ Accessor for component idx of an Edifact_Element """
+    def getter (self):
+        components = self.components
+        if idx < len (components):
+            return components [idx]
+        return ''
+    # end def getter
+    def setter (self, value):
+        components = self.components
+        for k in range (len (components), idx + 1):
+            components.append ('')
+        components [idx] = value
+        self._check (idx)
+    # end def setter
+    return property (getter, setter, doc = name)
+# end def _component_property
+
+def _element_property (idx, name):
+    """ Accessor for element idx of a Named_Edifact_Segment, missing
+        elements up to idx are created on access.
+    """
+    def getter (self):
+        elements = self.elements
+        e        = self.encoding
+        for i in range (len (elements), idx + 1):
+            el = Edifact_Element (encoding = e, parent = self, idx = i)
+            elements.append (el)
+        return elements [idx]
+    # end def getter
+    return property (getter, doc = name)
+# end def _element_property
+
 class Edifact_Element (_Part_Iter):
     """ An edifact data element (elements are delimited by the data
         element separator, usually '+')
+        Elements of a Named_Edifact_Segment are instances of a
+        subclass generated from the structure of the segment, it
+        has a property for each component.
+    >>> u = UNB ()
+    >>> e = u.interchange_sender
+    >>> e.__class__.__name__, e.by_name ['internal_id']
+    ('UNB_interchange_sender', 2)
+    >>> e.code_qualifier
+    'OD'
+    >>> e.internal_id = 'ABC'
+    >>> e.components
+    ['', 'OD', 'ABC']
+    >>> e.nonexisting = 1 # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    AttributeError: ... object has no attribute 'nonexisting'...
     """
 
-    attrs = ( 'encoding', 'una', 'components', 'structure', 'by_name'
-            , 'segment', 'parent'
+    __slots__ = \
+        ('encoding', 'una', 'segment', 'parent', '_components', '_raw')
+    structure = None
+    by_name   = {}
+
+    def __new__ \
+        ( cls
+        , encoding  = None
+        , una       = None
+        , bytes     = None
+        , parent    = None
+        , idx       = None
+        , *args, **kw
+        ):
+        if cls is Edifact_Element and idx is not None:
+            classes = getattr (parent, 'element_classes', ())
+            if idx < len (classes):
+                cls = classes [idx]
+        return object.__new__ (cls)
+    # end def __new__
+
+    @classmethod
+    def generate (cls, name, structure):
+        """ Generate a subclass for the given element structure """
+        d = dict \
+            ( __slots__ = ()
+            , structure = structure
+            , by_name   = {}
             )
+        for k, s in enumerate (structure [1]):
+            d ['by_name'][s [0]] = k
+            # Names clashing with our own attributes are only
+            # reachable via by_name
+            if not hasattr (cls, s [0]):
+                d [s [0]] = _component_property (k, s [0])
+        return type (cls) (name, (cls,), d)
+    # end def generate
+
     def __init__ \
         ( self
         , encoding  = 'latin-1'
@@ -700,30 +1067,44 @@ class Edifact_Element (_Part_Iter):
         , bytes     = None
         , parent    = None
         , idx       = None
+        , raw       = None
         ):
-        self.encoding   = encoding
-        self.una        = una
-        self.components = []
-        self.by_name    = {}
-        self.segment    = None
-        self.parent     = parent
-        self.structure  = None
-        if parent is not None and idx is not None:
-            structure = getattr (parent, 'structure', None)
-            if structure:
-                self.structure = structure [idx]
-        if self.structure:
-            for k, s in enumerate (self.structure [1]):
-                self.by_name [s [0]] = k
+        self.encoding    = encoding
+        self.una         = una
+        # An empty parsed element gets the defaults like a new one
+        if raw and not raw [1]:
+            raw = None
+        self._raw        = raw
+        self._components = None if raw else []
+        self.segment     = None
+        self.parent      = parent
         if bytes:
             self.from_bytes (bytes)
-        elif self.structure:
+        elif self.structure and raw is None:
             # Set default values
             for k, s in enumerate (self.structure [1]):
                 if len (s) > 5:
                     setattr (self, s [0], s [5])
     # end def __init__
 
+    @property
+    def components (self):
+        """ Components are decoded on first access only """
+        if self._components is None:
+            buf, spans = self._raw
+            t = self.una.tokenizer
+            e = self.encoding
+            self._components = [t.decode (buf, sp, e) for sp in spans]
+            self._raw = None
+        return self._components
+    # end def components
+
+    @components.setter
+    def components (self, components):
+        self._components = components
+        self._raw        = None
+    # end def components
+
     @property
     def element_name (self):
         n = "<unnamed>"
@@ -800,12 +1181,19 @@ class Edifact_Element (_Part_Iter):
     # end def check
 
     def from_bytes (self, bytes):
-        offs = 0
-        t    = self.una.component_sep
-        for b in self.iterparts (bytes [offs:], t):
-            self.append (self.unquote (b).decode (self.encoding))
+        buf = memoryview (bytes)
+        self.from_raw (buf, self.una.tokenizer.components (buf, 0, len (buf)))
     # end def from_bytes
 
+    def from_raw (self, buf, spans):
+        """ Set components from spans into buf as returned by the
+            Edifact_Tokenizer, decoding is deferred until the
+            components are accessed.
+        """
+        self._components = None
+        self._raw        = (buf, spans)
+    # end def from_raw
+
     def to_bytes (self):
         comps = []
         for c in self.components:
@@ -855,30 +1243,6 @@ class Edifact_Element (_Part_Iter):
         return b''.join (r)
     # end def unquote
 
-    def __getattr__ (self, name):
-        try:
-            idx = self.by_name [name]
-        except KeyError as e:
-            raise AttributeError (e)
-        if idx > len (self.components) - 1:
-            return ''
-        return self.components [idx]
-    # end def __getattr__
-
-    def __setattr__ (self, name, value):
-        if name in self.attrs:
-            self.__super.__setattr__ (name, value)
-        else:
-            try:
-                idx = self.by_name [name]
-            except KeyError as e:
-                raise AttributeError (e)
-            for k in range (len (self.components), idx + 1):
-                self.components.append ('')
-            self.components [idx] = value
-            self._check (idx)
-    # end def __setattr__
-
     def __str__ (self):
         r = []
         for c in self.components:
@@ -890,21 +1254,45 @@ class Edifact_Element (_Part_Iter):
 
 # end class Edifact_Element
 
-class Edifact_Segment (_Part_Iter):
+class Edifact_Segment (_Part_Iter, autosuper):
     """ Implements an EDIFACT segment used in ENGDAT V2
         A segment is prefixed with the (3-letter) record name and
         terminated by the current segment terminator.
     """
 
-    def __init__ (self, encoding = 'latin1', bytes = None, una = una):
+    def __init__ \
+        (self, encoding = 'latin1', bytes = None, una = una, tokens = None):
         self.encoding = encoding
         self.una      = una
         self.elements = []
+        self._tokens  = None
         if bytes is not None:
             self.from_bytes (bytes)
+        elif tokens is not None:
+            self.from_tokens (*tokens)
         self.__super.__init__ ()
     # end def __init__
 
+    @property
+    def elements (self):
+        """ Elements are created on first access only """
+        if self._tokens is not None:
+            buf, elements = self._tokens
+            self._tokens  = None
+            e = self.encoding
+            for l, spans in enumerate (elements):
+                el = Edifact_Element \
+                    (encoding = e, raw = (buf, spans), parent = self, idx = l)
+                self._elements.append (el)
+        return self._elements
+    # end def elements
+
+    @elements.setter
+    def elements (self, elements):
+        self._elements = elements
+        self._tokens   = None
+    # end def elements
+
     def check (self):
         """ Only possible with structure information
         """
@@ -926,16 +1314,20 @@ class Edifact_Segment (_Part_Iter):
         self.segment_name = bytes [:3].decode (self.encoding)
         assert self.length == 4 or bytes [3:4] == self.una.element_sep
         assert bytes [-1:] == self.una.segment_terminator
-        offs = 4
-        t = self.una.element_sep
-        e = self.encoding
-        for b in self.iterparts (bytes [offs:-1], t):
-            l  = len (self.elements)
-            el = Edifact_Element \
-                (encoding = e, bytes = b, parent = self, idx = l)
-            self.elements.append (el)
+        buf = memoryview (bytes)
+        self.from_tokens (buf, *next (self.una.tokenizer.tokenize (buf)))
     # end def from_bytes
 
+    def from_tokens (self, buf, start, end, elements):
+        """ Set elements from the output of Edifact_Tokenizer, the
+            element objects are created lazily.
+        """
+        self.length = end - start + 1
+        self.segment_name = str (buf [start:start + 3], self.encoding)
+        self.elements = []
+        self._tokens  = (buf, elements)
+    # end def from_tokens
+
     def __length__ (self):
         return self.length
     # end def __length__
@@ -953,15 +1345,41 @@ class Edifact_Segment (_Part_Iter):
 # end class Edifact_Segment
 
 class Named_Edifact_Segment (Edifact_Segment):
+    """ Segment with structure information: Each subclass gets the
+        name-to-index map by_name, the generated element classes and
+        a property for each element (created on first access).
+    """
+
+    structure = ()
+
+    def __init_subclass__ (cls, **kw):
+        super (Named_Edifact_Segment, cls).__init_subclass__ (**kw)
+        cls.by_name         = {}
+        cls.element_classes = []
+        for k, (ss, se) in enumerate (cls.structure):
+            name = ss [0]
+            cls.by_name [name] = k
+            cls.element_classes.append \
+                ( Edifact_Element.generate
+                    ('_'.join ((cls.__name__, name)), (ss, se))
+                )
+            setattr (cls, name, _element_property (k, name))
+    # end def __init_subclass__
 
     def __init__ (self, *args, **kw):
         self.segment_name = self.segment_class_name
         self.__super.__init__ (*args, **kw)
-        self.by_name = {}
-        for k, (ss, se) in enumerate (self.structure):
-            self.by_name [ss [0]] = k
     # end def __init__
 
+    def from_tokens (self, buf, start, end, elements):
+        if len (elements) > len (self.structure):
+            raise IndexError \
+                ( "%s: %d elements, structure has %d"
+                % (self.segment_name, len (elements), len (self.structure))
+                )
+        self.__super.from_tokens (buf, start, end, elements)
+    # end def from_tokens
+
     @property
     def segment_class_name (self):
         return self.__class__.__name__
@@ -980,21 +1398,6 @@ class Named_Edifact_Segment (Edifact_Segment):
                 self.elements [idx].check ()
     # end def check
 
-    def __getattr__ (self, name):
-        try:
-            idx = self.by_name [name]
-        except KeyError as e:
-            raise AttributeError (e)
-        el = len (self.elements)
-        e  = self.encoding
-        if idx >= el:
-            for i in range (el, idx + 1):
-                el = Edifact_Element \
-                    (encoding = e, parent = self, idx = i)
-                self.elements.append (el)
-        return self.elements [idx]
-    # end def __getattr__
-
 # end class Named_Edifact_Segment
 
 class UNB (Named_Edifact_Segment):
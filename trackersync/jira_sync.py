@@ -28,16 +28,28 @@ from __future__ import unicode_literals
 from __future__ import print_function
 from __future__ import absolute_import
 
+import os
 import requests
 import json
 import numbers
-from   time                 import sleep
+import hashlib
+import hmac
+import threading
+from   io                   import BytesIO
+from   http.server          import BaseHTTPRequestHandler, ThreadingHTTPServer
+from   tempfile             import SpooledTemporaryFile
+from   time                 import sleep, time
 from   datetime             import datetime, timedelta
 from   rsclib.autosuper     import autosuper
 from   rsclib.pycompat      import ustr, text_type
 from   trackersync          import tracker_sync
 from   urllib.parse         import urlencode
 
+try:
+    from requests_toolbelt  import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
+
 JSONDecodeError = json.decoder.JSONDecodeError
 
 Sync_Attribute                    = tracker_sync.Sync_Attribute
@@ -98,42 +110,113 @@ def jira_utctime (jiratime):
 # end def jira_utctime
 
 class Jira_File_Attachment (tracker_sync.File_Attachment):
+    """ Jira file attachment. The content is downloaded in chunks into
+        a spooled temporary file (which is kept in memory only up to
+        spool_size bytes) so that large attachments are never held
+        completely in memory. While downloading we compute size and
+        sha256 hash of the content.
+    """
+
+    chunk_size = 64 * 1024
+    spool_size = 1024 * 1024
+    # Warn only once if uploads cannot be streamed
+    warn_multipart = MultipartEncoder is None
 
     def __init__ (self, issue, url = None, **kw):
-        """ Either the url or the content must be given
+        """ Either the url, the content, or a file object (opened in
+            binary mode) must be given
         """
         self.url      = url
         self.dirty    = False
         self._content = None
+        self._file    = kw.pop ('file', None)
+        self.size     = None
+        self.sha256   = None
         if 'content' in kw:
             self._content = kw ['content']
             del kw ['content']
         self.__super.__init__ (issue, **kw)
+        if self._content is not None:
+            self.size   = len (self._content)
+            self.sha256 = hashlib.sha256 (self._content).hexdigest ()
     # end def __init__
 
     @property
     def content (self):
-        if self._content is None:
-            self.log.debug ('Jira content send GET: %s' % self.url)
-            r = self.issue.session.get (self.url)
-            if not r.ok:
-                self.issue.raise_error (r, "Content")
-            self._content = r.content
-        return self._content
+        """ Note that the content is not cached in memory if it was
+            downloaded or given as a file object, use the open method
+            for retrieving the content without reading it into memory.
+            We don't close the file so that the downloaded data (or
+            the file object given to us) can be reused.
+        """
+        if self._content is not None:
+            return self._content
+        f = self.open ()
+        f.seek (0)
+        return f.read ()
     # end def content
 
+    def _download (self):
+        self.log.debug ('Jira content send GET: %s' % self.url)
+        r = self.issue.session.get (self.url, stream = True)
+        if not r.ok:
+            self.issue.raise_error (r, "Content")
+        h = hashlib.sha256 ()
+        f = SpooledTemporaryFile (max_size = self.spool_size)
+        with r:
+            for chunk in r.iter_content (chunk_size = self.chunk_size):
+                h.update (chunk)
+                f.write (chunk)
+        self.size   = f.tell ()
+        self.sha256 = h.hexdigest ()
+        self._file  = f
+    # end def _download
+
+    def open (self):
+        """ Return a binary file object positioned at the start of the
+            content. Don't close the returned file if you intend to
+            access the content again: Closing it will discard the
+            downloaded data which is then fetched again on next access.
+        """
+        if self._content is not None:
+            return BytesIO (self._content)
+        if self._file is None or self._file.closed:
+            if self.url is None:
+                raise ValueError \
+                    ( "Attachment %s: file is closed and no url to "
+                      "download from" % self.name
+                    )
+            self._download ()
+        self._file.seek (0)
+        return self._file
+    # end def open
+
     def create (self):
-        if self._content is None:
+        if self._content is None and self._file is None:
             self.issue.log.error ("Create attachment: %s is empty" % self.name)
             return
         u = self.issue.url + '/issue/' + self.issue.id + '/attachments'
         h = {'X-Atlassian-Token': 'no-check'}
         t = self.type or 'application/octet-stream'
-        f = dict (file = (self.name, self.content, t))
+        f = dict (file = (self.name, self.open (), t))
         self.log.debug ('Jira send POST (file attachment): %s' % u)
-        r = self.issue.session.post (u, files = f, headers = h)
+        if MultipartEncoder is not None:
+            # Stream the multipart body instead of building it in memory
+            m = MultipartEncoder (fields = f)
+            h ['Content-Type'] = m.content_type
+            r = self.issue.session.post (u, data = m, headers = h)
+        else:
+            if self.warn_multipart:
+                self.issue.log.warn \
+                    ( "requests_toolbelt not installed, attachments "
+                      "are uploaded from memory"
+                    )
+                Jira_File_Attachment.warn_multipart = False
+            r = self.issue.session.post (u, files = f, headers = h)
         self.issue.log.debug \
-            ("Create attachment: name:%s type:%s" % (self.name, t))
+            ( "Create attachment: name:%s type:%s size:%s sha256:%s"
+            % (self.name, t, self.size, self.sha256)
+            )
         if not r.ok:
             self.issue.raise_error (r, 'Create attachment')
         j = r.json ()
@@ -152,6 +235,13 @@ class Jira_Backend (autosuper):
         local tracker as well as when Jira is the remote tracker
     """
 
+    # Number of comments retrieved with one request
+    comment_page_size        = 50
+    # Watermark used for retrieving issue_comments and highest comment
+    # id seen, see get_messages
+    issue_comments_watermark = None
+    comment_watermark        = None
+
     def __init__ (self, syncer, id, **kw):
         self.mangle_filenames = True
         self.__super.__init__ (syncer, id, **kw)
@@ -175,20 +265,36 @@ class Jira_Backend (autosuper):
             yield a
     # end def _attachment_iter
 
-    def _message_iter (self):
+    def _message_iter (self, watermark = None):
+        """ Iterate over comments of this issue, newest first.
+            The comments are retrieved in pages of comment_page_size.
+            If a watermark (the highest comment id seen during a
+            previous sync) is given we stop as soon as we reach a
+            comment that is not newer than the watermark.
+        """
         u = self.url + '/issue/' + self.id + '/comment'
-        self.log.debug ('Jira message send GET: %s' % u)
-        r = self.session.get (u)
-        if not r.ok:
-            self.raise_error (r, "Message of %s" % self.id)
-        j = r.json ()
-        self.log.debug ('Jira receive:')
-        for line in r.text.split ('\n'):
-            self.log.debug (line)
-        if not j ['comments']:
-            assert j ['startAt'] == 0 and j ['total'] == 0
-        for a in j ['comments']:
-            yield a
+        d = dict (orderBy = '-created', maxResults = self.comment_page_size)
+        start = 0
+        while True:
+            d ['startAt'] = start
+            self.log.debug ('Jira message send GET: %s %s' % (u, d))
+            r = self.session.get (u, params = d)
+            if not r.ok:
+                self.raise_error (r, "Message of %s" % self.id)
+            j = r.json ()
+            self.log.debug ('Jira receive:')
+            for line in r.text.split ('\n'):
+                self.log.debug (line)
+            if not j ['comments']:
+                assert j ['startAt'] >= j ['total']
+                break
+            for a in j ['comments']:
+                if watermark is not None and int (a ['id']) <= watermark:
+                    return
+                yield a
+            start = j ['startAt'] + len (j ['comments'])
+            if start >= j ['total']:
+                break
     # end def _message_iter
 
     def file_attachments (self, name = None):
@@ -236,20 +342,17 @@ class Jira_Backend (autosuper):
     # end def mangle_file_name
 
     def attach_file (self, other_file, name = None):
-        cls   = Jira_File_Attachment
-        fname = other_file.name
+        if other_file.dummy:
+            return self._attach_file (Jira_File_Attachment, other_file, name)
         fname = self.mangle_file_name (other_file.name)
-        fcp = tracker_sync.File_Attachment \
-            ( other_file.issue
-            , url     = getattr (other_file, 'url', None)
-            , id      = getattr (other_file, 'id',  None)
-            , name    = fname
-            , type    = other_file.type
-            , content = other_file.content
-            )
-        f = self._attach_file (cls, fcp, name)
-        if f is None:
-            return
+        # Avoid reading the content into memory if the other side
+        # supports streaming
+        if hasattr (other_file, 'open'):
+            kw = dict (file = other_file.open ())
+        else:
+            kw = dict (content = other_file.content)
+        f = Jira_File_Attachment \
+            (self, name = fname, type = other_file.type, ** kw)
         f.dirty = True
         if self.attachments is None:
             self.attachments = []
@@ -257,10 +360,18 @@ class Jira_Backend (autosuper):
         self.dirty = True
     # end def attach_file
 
-    def get_messages (self):
-        if self.issue_comments is None:
+    def get_messages (self, watermark = None):
+        """ Get comments of this issue. If a watermark is given, only
+            comments newer than the watermark are retrieved. The
+            highest comment id seen is kept in comment_watermark.
+        """
+        if  (  self.issue_comments is None
+            or self.issue_comments_watermark != watermark
+            ):
             self.issue_comments = {}
-            for m in self._message_iter ():
+            self.issue_comments_watermark = watermark
+            self.comment_watermark        = watermark
+            for m in self._message_iter (watermark):
                 # This differs for server and cloud:
                 authorkey = 'key'
                 if authorkey not in m ['updateAuthor']:
@@ -274,6 +385,10 @@ class Jira_Backend (autosuper):
                     , content     = m ['body']
                     )
                 self.issue_comments [msg.id] = msg
+                mid = int (msg.id)
+                if self.comment_watermark is None:
+                    self.comment_watermark = mid
+                self.comment_watermark = max (self.comment_watermark, mid)
         return self.issue_comments
     # end def get_messages
 
@@ -328,6 +443,8 @@ class Jira_Syncer (tracker_sync.Syncer):
     raise_error = Local_Issue_Class.raise_error
     acpt_header = { 'accept': 'application/json' }
     json_header = { 'content-type': 'application/json' }
+    # Maximum number of issues Jira accepts in one bulk create request
+    bulk_create_max = 50
 
     def __init__ (self, remote_name, attributes, opt, cfg, **kw):
         self.url          = opt.url
@@ -343,6 +460,11 @@ class Jira_Syncer (tracker_sync.Syncer):
         self.session      = requests.Session ()
         self.session.auth = (opt.local_username, opt.local_password)
         self.item_cache   = {}
+        # Number of issues to create with one request, 0 disables
+        # bulk creation, see defer_create.
+        self.bulk_size    = min \
+            (getattr (opt, 'bulk_create', 0) or 0, self.bulk_create_max)
+        self.create_queue = []
         # This initializes schema and already needs the session
         self.__super.__init__ (remote_name, attributes, opt, cfg, **kw)
     # end def __init__
@@ -414,18 +536,44 @@ class Jira_Syncer (tracker_sync.Syncer):
         # We used to query /issue/createmeta?expand=projects.issuetypes.fields
         # and find out all multilinks. This is deprecated and finally
         # removed in Jira 9.0.
-        # We now do this only for for the default project which is
-        # configured in LOCAL_PROJECT (or command-line option project-key).
-        # We build the multilinks_by_project on the fly here.
+        # We now do this for the default project which is configured
+        # in LOCAL_PROJECT (or command-line option project-key) here,
+        # other projects are added on the fly, see project_multilinks.
         self.multilinks_by_project = {}
         self.multilink_keyattr     = {}
+        # Reverse index over all projects: class -> key -> value
+        self.multilink_index       = {}
+        self.project_key_cache     = (None, None)
+        self.update_project_metadata (project_key, parse_schema = True)
+        # Some day find out if we can discover the schema via REST
+        # These are custom schema options
+        self.schema ['option'] = dict (id = 'string', value = 'string')
+        for name in self.schema_classes:
+            if name not in self.schema:
+                self.schema [name] = dict \
+                    (id = 'string', name = 'string', key = 'string')
+        self.schema ['user']['displayName'] = 'string'
+        self.default_class = 'issue'
+    # end def compute_schema
+
+    def update_project_metadata \
+        (self, project_key, parse_schema = False, refresh = False):
+        """ Get allowed values of multilinks (e.g. versions,
+            components, custom field options) of the given project.
+            With parse_schema set the fields of the configured project
+            and issue type are added to the schema. With refresh set
+            cached results from a previous query are discarded.
+        """
+        issue_type  = getattr (self.opt, 'issue_type', None)
         crurl = 'createmeta/%(project_key)s/issuetypes?' \
                 'expand=projects.issuetypes.fields'  \
                 % locals ()
         if issue_type:
             crurl += '&issuetypeNames=%s' % issue_type
+        if refresh:
+            self.item_cache.pop (('issue', crurl), None)
         cm = self.getitem ('issue', crurl)
-        ml = self.multilinks_by_project [project_key] = {}
+        ml = {}
         if 'values' in cm:
             ik = 'values'
         else:
@@ -438,6 +586,8 @@ class Jira_Syncer (tracker_sync.Syncer):
             type_id = type ['id']
             u  = 'createmeta/%(project_key)s/issuetypes/%(type_id)s' \
                % locals ()
+            if refresh:
+                self.item_cache.pop (('issue', u), None)
             it = self.getitem ('issue', u)
             if 'total' in it and it ['total'] > it ['maxResults']:
                 raise NotImplementedError ('Too many results for one query')
@@ -447,7 +597,7 @@ class Jira_Syncer (tracker_sync.Syncer):
                 iterlist = it ['fields']
             for entry in iterlist:
                 # New way of discovering fields
-                if project_key and issue_type:
+                if parse_schema and project_key and issue_type:
                     self.parse_schema_entry (entry ['name'], entry)
                 m = entry ['schema'].get ('items')
                 if m in self.multilinks:
@@ -469,16 +619,41 @@ class Jira_Syncer (tracker_sync.Syncer):
                         vn = av [k]
                         ml [m][vn] = dict \
                             ((k, av [k]) for k in av if k != 'self')
-        # Some day find out if we can discover the schema via REST
-        # These are custom schema options
-        self.schema ['option'] = dict (id = 'string', value = 'string')
-        for name in self.schema_classes:
-            if name not in self.schema:
-                self.schema [name] = dict \
-                    (id = 'string', name = 'string', key = 'string')
-        self.schema ['user']['displayName'] = 'string'
-        self.default_class = 'issue'
-    # end def compute_schema
+        self.multilinks_by_project [project_key] = ml
+        # Rebuild the reverse index so that renamed or re-created
+        # values of a refreshed project are picked up, projects seen
+        # earlier take precedence.
+        self.multilink_index = {}
+        for ml in self.multilinks_by_project.values ():
+            for m in ml:
+                idx = self.multilink_index.setdefault (m, {})
+                for vn in ml [m]:
+                    idx.setdefault (vn, ml [m][vn])
+    # end def update_project_metadata
+
+    def current_project_key (self):
+        """ Project key of the current issue, cached per current_id
+        """
+        cid, pkey = self.project_key_cache
+        if cid != self.current_id or pkey is None:
+            pkey = self.get (self.current_id, 'project.key')
+            self.project_key_cache = (self.current_id, pkey)
+        return pkey
+    # end def current_project_key
+
+    def project_multilinks (self, project_key, refresh = False):
+        """ Return allowed multilink values of the given project, these
+            are retrieved on first use of a project. With refresh set
+            they are retrieved again, but only once per sync run.
+        """
+        if refresh:
+            if project_key in self.refreshed_projects:
+                return self.multilinks_by_project [project_key]
+            self.refreshed_projects.add (project_key)
+        if refresh or project_key not in self.multilinks_by_project:
+            self.update_project_metadata (project_key, refresh = refresh)
+        return self.multilinks_by_project [project_key]
+    # end def project_multilinks
 
     def _create (self, cls, ** kw):
         """ Debug and dryrun is handled by base class create. """
@@ -498,6 +673,47 @@ class Jira_Syncer (tracker_sync.Syncer):
         return j ['key']
     # end def _create
 
+    def _bulk_create (self, cls, itemlist):
+        """ Create several items with one request. Returns a list with
+            the new key or an error message (a RuntimeError instance)
+            for each item in itemlist.
+        """
+        u = self.url + '/' + cls + '/bulk'
+        d = dict (issueUpdates = [dict (fields = kw) for kw in itemlist])
+        self.log.debug ('Jira send POST: %s' % u)
+        for line in json.dumps (d, indent = 4).split ('\n'):
+            self.log.debug (line)
+        r = self.session.post \
+            (u, data = json.dumps (d), headers = self.json_header)
+        # Jira returns 400 if some (or all) of the items failed, the
+        # failed items are in 'errors'
+        if not r.ok and r.status_code != 400:
+            self.raise_error (r, "Bulk create %s" % cls)
+        j = r.json ()
+        self.log.debug ('Jira receive:')
+        for line in r.text.split ('\n'):
+            self.log.debug (line)
+        if not r.ok and 'errors' not in j:
+            self.raise_error (r, "Bulk create %s" % cls)
+        errors = {}
+        for e in j.get ('errors', []):
+            ee  = e.get ('elementErrors', {})
+            msg = list (ee.get ('errorMessages', []))
+            msg.extend \
+                ('%s: %s' % (k, v) for k, v in ee.get ('errors', {}).items ())
+            errors [e ['failedElementNumber']] = RuntimeError \
+                ('Error %s: %s' % (e.get ('status'), ', '.join (msg)))
+        # Created issues are returned in order of the request
+        created = iter (j.get ('issues', []))
+        result  = []
+        for n in range (len (itemlist)):
+            if n in errors:
+                result.append (errors [n])
+            else:
+                result.append (next (created) ['key'])
+        return result
+    # end def _bulk_create
+
     def add_comment (self, id, msg):
         u = self.url + '/' + self.default_class + '/' + str (id) + '/comment'
         c = [ dict (type = 'text', text = msg.content) ]
@@ -513,6 +729,20 @@ class Jira_Syncer (tracker_sync.Syncer):
         return j ['id']
     # end def add_comment
 
+    def defer_create (self, id, remote_id, remote_issue, attr, classdict):
+        """ With bulk creation enabled we queue the new issue, the
+            issues are created when the queue is full or in flush.
+        """
+        if not self.bulk_size or self.dry_run:
+            return False
+        self.create_queue.append \
+            ((id, remote_id, remote_issue, attr, classdict))
+        self.log_verbose ("Queued create: %s/%s" % (id, remote_id))
+        if len (self.create_queue) >= self.bulk_size:
+            self.flush ()
+        return True
+    # end def defer_create
+
     def dump_schema (self):
         self.__super.dump_schema ()
         print ('NAMES:')
@@ -578,6 +808,38 @@ class Jira_Syncer (tracker_sync.Syncer):
         return result
     # end def filter
 
+    def flush (self):
+        """ Create queued issues (see defer_create) and complete their
+            sync. Errors are reported for the originating remote issue,
+            for failed items no sync db entry is written, so creation is
+            retried with the next sync.
+        """
+        self.__super.flush ()
+        queue, self.create_queue = self.create_queue, []
+        if not queue:
+            return
+        self.log_debug \
+            ( "srv.bulk_create %s: %s items"
+            % (self.default_class, len (queue))
+            )
+        keys = self._bulk_create \
+            (self.default_class, [q [3] for q in queue])
+        for (id, rid, remote_issue, attr, classdict), key in zip (queue, keys):
+            if isinstance (key, Exception):
+                self.log.error ("Error creating issue for %s: %s" % (rid, key))
+                del self.localissues [id]
+                continue
+            # New issues don't have a sync db entry yet
+            self.oldremote = {}
+            try:
+                iid = self.created_issue (id, key, rid, remote_issue)
+                self.update_aux_classes (iid, rid, remote_issue, classdict)
+                self.update_remote_issue (iid, rid, remote_issue)
+            except Exception:
+                self.log.error ("Error syncing %s" % rid)
+                self.log_exception ()
+    # end def flush
+
     def format_multilink (self, attrname, values, fancy = False):
         """ The components property is special, it is of the form:
             {'components':
@@ -621,7 +883,7 @@ class Jira_Syncer (tracker_sync.Syncer):
             different) via the create flag.
             For Multilinks see format_multilink above.
         """
-        pkey       = self.get (self.current_id, 'project.key')
+        pkey       = self.current_project_key ()
         new        = {}
         transition = {}
         for k in attrs:
@@ -637,7 +899,7 @@ class Jira_Syncer (tracker_sync.Syncer):
                     #    continue
                     if self.schema [classname][prop][0] == 'Multilink':
                         cls = self.schema [classname][prop][1]
-                        mbp = self.multilinks_by_project [pkey].get (cls)
+                        mbp = self.project_multilinks (pkey).get (cls)
                         mlk = self.multilink_keyattr.get (cls)
                         if mbp and mlk:
                             if attrname != mlk:
@@ -750,15 +1012,18 @@ class Jira_Syncer (tracker_sync.Syncer):
         if cls in self.multilink_keyattr:
             mkey = self.multilink_keyattr [cls]
             if self.current_id == -1:
-                for pkey in self.multilinks_by_project:
-                    try:
-                        return self.multilinks_by_project [pkey][cls][key][mkey]
-                    except KeyError:
-                        pass
-                raise KeyError (key)
-            else:
-                pkey = self.get (self.current_id, 'project.key')
-                return self.multilinks_by_project [pkey][cls][key][mkey]
+                # Search all projects seen so far
+                if key not in self.multilink_index.get (cls, {}):
+                    # Maybe a new version or component: Refresh all
+                    for pkey in list (self.multilinks_by_project):
+                        self.project_multilinks (pkey, refresh = True)
+                return self.multilink_index [cls][key][mkey]
+            pkey = self.current_project_key ()
+            ml   = self.project_multilinks (pkey)
+            if key not in ml.get (cls, {}):
+                # Maybe a new version or component: Refresh
+                ml = self.project_multilinks (pkey, refresh = True)
+            return ml [cls][key][mkey]
         try:
             # This may be specific to the cloud api:
             # It looks like the server api *can* look this up by name
@@ -786,6 +1051,12 @@ class Jira_Syncer (tracker_sync.Syncer):
         return j ['id']
     # end def lookup
 
+    def reinit (self):
+        self.__super.reinit ()
+        self.refreshed_projects = set ()
+        self.project_key_cache  = (None, None)
+    # end def reinit
+
     def _set_status (self, id, trans):
         """ Handle state changes, these must be done via transitions
             And transitions must be submitted as a post
@@ -848,14 +1119,15 @@ class Jira_Syncer (tracker_sync.Syncer):
             self._set_status (id, trans)
     # end def _setitem
 
-    def sync_new_local_issues (self, new_remote_issue):
+    def sync_new_local_issues (self, new_remote_issue, searchdict = None):
         """ Determine *local* issues which are not yet synced to the
-            remote.
+            remote. The optional searchdict restricts the search, e.g.,
+            to a single issue key.
         """
         # Method for generating new remote issue, typically gets an
         # empty dictionary as parameter
         self.new_remote_issue = new_remote_issue
-        for issue in self.filter ('issue', {}):
+        for issue in self.filter ('issue', searchdict or {}):
             iid = issue ['key']
             if iid in self.localissues:
                 #print ('Found: %s' % iid)
@@ -871,6 +1143,20 @@ class Jira_Syncer (tracker_sync.Syncer):
             self.sync_new_local_issue (iid)
     # end def sync_new_local_issues
 
+    def sync_db_attributes (self, iid):
+        """ In addition to the local id we keep the highest comment id
+            seen as a watermark for incremental comment retrieval.
+        """
+        d  = self.__super.sync_db_attributes (iid)
+        wm = self.message_watermark (iid)
+        li = self.localissues.get (iid)
+        if li is not None and li.comment_watermark is not None:
+            wm = max (wm or 0, li.comment_watermark)
+        if wm is not None:
+            d ['__message_watermark__'] = wm
+        return d
+    # end def sync_db_attributes
+
     def update_aux_classes (self, id, r_id, r_issue, classdict):
         self.__super.update_aux_classes (id, r_id, r_issue, classdict)
         if self.dry_run:
@@ -884,4 +1170,168 @@ class Jira_Syncer (tracker_sync.Syncer):
 
 # end class Jira_Syncer
 
+def webhook_issue_key (payload, project_key = None):
+    """ Return the issue key of a Jira issue or comment webhook payload
+        or None if the event is not for an issue of the given project.
+    >>> p = dict (webhookEvent = 'jira:issue_updated')
+    >>> f = dict (project = dict (key = 'PRJ'))
+    >>> p ['issue'] = dict (key = 'PRJ-17', fields = f)
+    >>> webhook_issue_key (p, 'PRJ')
+    'PRJ-17'
+    >>> print (webhook_issue_key (p, 'OTHER'))
+    None
+    >>> p = dict (webhookEvent = 'comment_created')
+    >>> p ['comment'] = dict (id = '10042', body = 'Hello')
+    >>> p ['issue'] = dict (id = '10001', key = 'PRJ-4', fields = {})
+    >>> webhook_issue_key (p, 'PRJ')
+    'PRJ-4'
+    >>> print (webhook_issue_key (dict (webhookEvent = 'user_created')))
+    None
+    """
+    event = payload.get ('webhookEvent', '')
+    if not event.startswith (('jira:issue_', 'comment_')):
+        return None
+    issue = payload.get ('issue') or {}
+    key   = issue.get ('key')
+    if not key:
+        return None
+    if project_key:
+        pkey = (issue.get ('fields') or {}).get ('project', {}).get ('key')
+        if pkey is None:
+            pkey = key.rsplit ('-', 1) [0]
+        if pkey != project_key:
+            return None
+    return key
+# end def webhook_issue_key
+
+class Jira_Webhook_Queue (autosuper):
+    """ Queue of issue keys reported by Jira webhooks.
+        Each key is queued with the time of the last event, a key is
+        due only if no event arrived for debounce seconds, so a burst
+        of events for the same issue results in a single sync. The
+        queue is persisted to filename on each change, so queued keys
+        survive a restart.
+    """
+
+    def __init__ (self, filename, debounce = 5):
+        self.filename = filename
+        self.debounce = debounce
+        self.lock     = threading.Lock ()
+        self.queue    = {}
+        try:
+            with open (self.filename) as f:
+                self.queue = json.load (f)
+        except (EnvironmentError, ValueError):
+            pass
+    # end def __init__
+
+    def __len__ (self):
+        return len (self.queue)
+    # end def __len__
+
+    def add (self, key, now = None):
+        with self.lock:
+            self.queue [key] = now or time ()
+            self.save ()
+    # end def add
+
+    def done (self, key):
+        """ Remove key after successful sync unless a new event arrived
+            in the meantime.
+        """
+        with self.lock:
+            if self.queue.get (key, 0) <= time () - self.debounce:
+                self.queue.pop (key, None)
+                self.save ()
+    # end def done
+
+    def due (self, now = None):
+        """ Return keys without events in the last debounce seconds.
+            The keys stay in the queue until done is called.
+        """
+        now = now or time ()
+        with self.lock:
+            return sorted \
+                (k for k, t in self.queue.items () if t <= now - self.debounce)
+    # end def due
+
+    def save (self):
+        """ Must be called with lock held """
+        tmp = self.filename + '.new'
+        with open (tmp, 'w') as f:
+            json.dump (self.queue, f)
+        os.replace (tmp, self.filename)
+    # end def save
+
+# end class Jira_Webhook_Queue
+
+class Jira_Webhook_Handler (BaseHTTPRequestHandler):
+
+    def do_POST (self):
+        n    = int (self.headers.get ('Content-Length', 0))
+        body = self.rfile.read (n)
+        srv  = self.server
+        if srv.secret:
+            sig = 'sha256=' + hmac.new \
+                (srv.secret.encode ('utf-8'), body, hashlib.sha256).hexdigest ()
+            if not hmac.compare_digest \
+                (sig, self.headers.get ('X-Hub-Signature', '')):
+                srv.log.error ('Webhook: invalid signature')
+                self.send_response (403)
+                self.end_headers ()
+                return
+        try:
+            payload = json.loads (body)
+        except ValueError:
+            srv.log.error ('Webhook: invalid json')
+            self.send_response (400)
+            self.end_headers ()
+            return
+        key = webhook_issue_key (payload, srv.project_key)
+        if key:
+            srv.log.debug \
+                ('Webhook: %s %s' % (payload.get ('webhookEvent'), key))
+            srv.queue.add (key)
+        self.send_response (204)
+        self.end_headers ()
+    # end def do_POST
+
+    def log_message (self, format, *args):
+        self.server.log.debug ('Webhook: ' + format % args)
+    # end def log_message
+
+# end class Jira_Webhook_Handler
+
+class Jira_Webhook_Server (ThreadingHTTPServer, autosuper):
+    """ Listen for Jira issue and comment webhooks and put the issue
+        keys into the given Jira_Webhook_Queue. If a secret is given
+        the X-Hub-Signature header is checked.
+    """
+
+    daemon_threads = True
+
+    def __init__ \
+        ( self
+        , address
+        , queue
+        , log
+        , project_key = None
+        , secret      = None
+        ):
+        self.queue       = queue
+        self.log         = log
+        self.project_key = project_key
+        self.secret      = secret
+        self.__super.__init__ (address, Jira_Webhook_Handler)
+    # end def __init__
+
+    def start (self):
+        """ Serve requests in a background thread """
+        t = threading.Thread (target = self.serve_forever, daemon = True)
+        t.start ()
+        return t
+    # end def start
+
+# end class Jira_Webhook_Server
+
 Syncer = Jira_Syncer
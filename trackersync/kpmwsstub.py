@@ -0,0 +1,831 @@
+#!/usr/bin/python3
+# Copyright (C) 2026 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# All rights reserved
+# ****************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+# ****************************************************************************
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import absolute_import
+import os
+import re
+import gzip
+import base64
+import random
+import hashlib
+import logging
+import threading
+from argparse           import ArgumentParser
+from datetime           import datetime, timedelta
+from http.server        import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time               import sleep, monotonic
+from urllib.parse       import urlsplit
+from lxml               import etree
+from rsclib.autosuper   import autosuper
+
+from zeep               import Client
+from zeep.xsd           import SkipValue
+from zeep.wsdl.utils    import etree_to_string
+
+from trackersync        import kpmwssync
+
+def soap_body (envelope):
+    """ Return first child of SOAP Body or None """
+    for e in envelope:
+        if etree.QName (e).localname == 'Body' and len (e):
+            return e [0]
+    return None
+# end def soap_body
+
+def conform (xsd_type, value):
+    """ Make value conform to the given zeep xsd type: Items of dicts
+        not in the schema are dropped, missing required elements are
+        skipped when rendering. This allows the synthetic data to be
+        used with different versions of the KPM schema.
+    """
+    if not isinstance (value, dict) or not hasattr (xsd_type, 'elements'):
+        return value
+    result = {}
+    for name, element in xsd_type.elements:
+        if name in value:
+            v = value [name]
+            if isinstance (v, list):
+                v = [conform (element.type, x) for x in v]
+            else:
+                v = conform (element.type, v)
+            result [name] = v
+        elif not element.is_optional:
+            result [name] = SkipValue
+    return result
+# end def conform
+
+class Synthetic_KPM (autosuper):
+    """ Synthetic dataset of KPM problems. For a given seed the dataset
+        is always the same. Each problem has the given number of process
+        steps and documents. With a change_rate > 0 the given fraction of
+        problems gets a new process step each time the overview is
+        retrieved. The methods named after the KPM operations get the
+        request (as parsed by zeep) and return a dict with the response.
+    """
+
+    success    = 'Method completed successfully'
+    step_types = list (kpmwssync.Process_Steps.step_map)
+    step_fmt   = '%Y-%m-%d-%H.%M.%S.%f'
+    actions    = \
+        ( 'GET_DEVELOPMENT_PROBLEM_DATA', 'GET_PROCESS_STEP_LIST'
+        , 'GET_PROCESS_STEPS', 'GET_DOCUMENT_LIST', 'GET_DOCUMENT'
+        , 'ADD_DOCUMENT', 'ADD_NOTICE', 'ADD_SUPPLIER_QUESTION'
+        , 'ADD_SUPPLIER_RESPONSE'
+        )
+
+    def __init__ \
+        ( self
+        , problems      = 100
+        , steps         = 5
+        , documents     = 2
+        , document_size = 100 * 1024
+        , change_rate   = 0.0
+        , seed          = 0
+        , first         = 1000000
+        ):
+        self.rng           = random.Random (seed)
+        self.lock          = threading.Lock ()
+        self.document_size = document_size
+        self.change_rate   = change_rate
+        self.clock         = datetime (2020, 1, 1)
+        self.problems      = {}
+        self.docid         = 0
+        for n in range (problems):
+            id = str (first + n)
+            self.problems [id] = self.make_problem (id, steps, documents)
+    # end def __init__
+
+    def timestamp (self):
+        """ Strictly increasing timestamp, used for process step ids """
+        self.clock = max \
+            (self.clock + timedelta (microseconds = 1), datetime.now ())
+        return self.clock
+    # end def timestamp
+
+    def make_problem (self, id, steps, documents):
+        rng = self.rng
+        pr  = dict \
+            ( ProblemNumber       = id
+            , ShortText           = 'Synthetic problem %s' % id
+            , Description         = ' '.join
+                ('Description of problem %s.' % id for i in range (20))
+            , Rating              = rng.choice (('A', 'B', 'C'))
+            , EngineeringStatus   = str (rng.randint (0, 5))
+            , SupplierStatus      = '0'
+            , SupplierErrorNumber = ''
+            , Frequency           = str (rng.randint (1, 3))
+            , Repeatable          = rng.choice (('0', '1'))
+            , Visibility          = '1'
+            , Workflow            = '42'
+            , Origin              = dict
+                (MainProcess = 'EK', SubProcess = 'SE', Phase = 'PVS')
+            , Creator             = dict
+                ( Address = dict (OrganisationalUnit = 'EEKE', Plant = 'Z')
+                )
+            )
+        p = dict (problem = pr, steps = [], documents = [])
+        for n in range (steps):
+            self.clock += timedelta (seconds = rng.randint (1, 3600))
+            self.add_step (p, rng.choice (self.step_types), 'Step %d' % n)
+        for n in range (documents):
+            self.docid += 1
+            p ['documents'].append \
+                ( dict
+                    ( DocumentId  = str (self.docid)
+                    , Name        = 'document-%s' % self.docid
+                    , Suffix      = 'bin'
+                    , AccessRight = '0'
+                    , Description = 'Synthetic document'
+                    , data        = None
+                    )
+                )
+        return p
+    # end def make_problem
+
+    def add_step (self, p, pstype, text, sr = None):
+        id = self.timestamp ().strftime (self.step_fmt)
+        step = dict \
+            ( ProcessStepTypeDescription = pstype
+            , ProcessStepId              = id
+            , CreationDate               = id
+            , Text                       = text
+            , LastChanger                = dict
+                (UserId = 'DUMMY', UserName = 'Synthetic User')
+            )
+        if pstype == 'Lieferantenaussage':
+            step ['SupplierResponse'] = sr or dict (Status = '0')
+        p ['steps'].append (step)
+        return id
+    # end def add_step
+
+    def document_data (self, doc):
+        if doc ['data'] is not None:
+            return doc ['data']
+        block = hashlib.sha256 (doc ['DocumentId'].encode ('ascii')).digest ()
+        n     = self.document_size // len (block) + 1
+        return (block * n) [:self.document_size]
+    # end def document_data
+
+    def response (self, msg = None, **kw):
+        kw ['ResponseMessage'] = dict (MessageText = msg or self.success)
+        return kw
+    # end def response
+
+    def problem (self, request):
+        return self.problems.get (str (request ['ProblemNumber']))
+    # end def problem
+
+    def GetServiceInfo (self, request):
+        return self.response (Version = 'Synthetic')
+    # end def GetServiceInfo
+
+    def GetMultipleProblemData (self, request):
+        with self.lock:
+            if self.change_rate:
+                n = int (len (self.problems) * self.change_rate)
+                for id in self.rng.sample (sorted (self.problems), n):
+                    self.add_step \
+                        (self.problems [id], 'Aussage', 'New statement')
+            refs = [dict (ProblemNumber = id) for id in self.problems]
+        return self.response (ProblemReference = refs)
+    # end def GetMultipleProblemData
+
+    def GetProblemActions (self, request):
+        if not self.problem (request):
+            return self.response ('Problem not found')
+        return self.response (Action = list (self.actions))
+    # end def GetProblemActions
+
+    def GetDevelopmentProblemData (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        return self.response (DevelopmentProblem = p ['problem'])
+    # end def GetDevelopmentProblemData
+
+    def GetProcessStepList (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        with self.lock:
+            items = \
+                [ dict
+                    ( ProblemNumber              = request ['ProblemNumber']
+                    , ProcessStepTypeDescription = s ['ProcessStepTypeDescription']
+                    , ProcessStepId              = s ['ProcessStepId']
+                    )
+                  for s in p ['steps']
+                ]
+        return self.response (ProcessStepItem = items)
+    # end def GetProcessStepList
+
+    def GetProcessSteps (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        ids = set (request ['ProcessStepId'] or [])
+        with self.lock:
+            steps = [s for s in p ['steps'] if s ['ProcessStepId'] in ids]
+        return self.response (ProcessStep = steps)
+    # end def GetProcessSteps
+
+    def GetDocumentList (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        with self.lock:
+            docs = [ dict ((k, v) for k, v in d.items () if k != 'data')
+                     for d in p ['documents']
+                   ]
+        return self.response (DocumentReference = docs)
+    # end def GetDocumentList
+
+    def GetDocument (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        for d in p ['documents']:
+            if d ['DocumentId'] == str (request ['DocumentId']):
+                doc = dict ((k, v) for k, v in d.items () if k != 'data')
+                doc ['Data'] = self.document_data (d)
+                doc ['Size'] = len (doc ['Data'])
+                return self.response (Document = doc)
+        return self.response ('Document not found')
+    # end def GetDocument
+
+    def AddDocument (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        d = request ['Document']
+        with self.lock:
+            self.docid += 1
+            id = str (self.docid)
+            p ['documents'].append \
+                ( dict
+                    ( DocumentId  = id
+                    , Name        = d ['Name']
+                    , Suffix      = d ['Suffix']
+                    , AccessRight = d ['AccessRight']
+                    , Description = None
+                    , data        = d ['Data'] or b''
+                    )
+                )
+        return self.response (DocumentReference = id)
+    # end def AddDocument
+
+    def add_text_step (self, request, pstype, text):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        with self.lock:
+            id = self.add_step (p, pstype, text)
+        # KPM returns the id of new steps in a different format
+        id = datetime.strptime (id, self.step_fmt)
+        id = id.strftime ('%Y-%m-%d %H:%M:%S.%f')
+        return self.response (ProcessStepId = id)
+    # end def add_text_step
+
+    def AddNotice (self, request):
+        return self.add_text_step (request, 'Aussage', request ['Notice'])
+    # end def AddNotice
+
+    def AddSupplierQuestion (self, request):
+        return self.add_text_step \
+            (request, 'Rückfrage', request ['SupplierQuestion'])
+    # end def AddSupplierQuestion
+
+    def AddSupplierResponse (self, request):
+        p = self.problem (request)
+        if not p:
+            return self.response ('Problem not found')
+        sr = request ['SupplierResponse']
+        sr = dict \
+            ( Status      = sr ['Status']
+            , ErrorNumber = sr ['ErrorNumber']
+            , VersionOk   = sr ['VersionOk']
+            )
+        with self.lock:
+            pr = p ['problem']
+            pr ['SupplierStatus']      = sr ['Status']
+            pr ['SupplierErrorNumber'] = sr ['ErrorNumber']
+            id = self.add_step \
+                (p, 'Lieferantenaussage', request ['ResponseText'], sr)
+        return self.response (ProcessStepId = id)
+    # end def AddSupplierResponse
+
+# end class Synthetic_KPM
+
+class KPM_Recording (autosuper):
+    """ Responses recorded with the --log-xml-to option of kpmwssync.
+        Responses are indexed by the request element and the problem
+        number, document id and process step ids of the request, for
+        repeated requests the last response is used. Recordings with
+        truncated document data (see KPM_XML_LOG_DATA_LIMIT) or with
+        streamed document data (which is not logged) are ignored.
+    """
+
+    truncated = re.compile (rb'\.\.\.\[\d+ more bytes\]')
+    # Only the first 9 bytes of the marker have a fixed encoding
+    streamed  = base64.b64encode (kpmwssync.KPM_Transport.marker_id) [:12]
+    keys      = ('ProblemNumber', 'DocumentId')
+
+    def __init__ (self, log):
+        self.log       = log
+        self.responses = {}
+    # end def __init__
+
+    def key (self, body):
+        """ Compute key from body element of a request
+            >>> r = KPM_Recording (None)
+            >>> b = etree.fromstring \\
+            ...     ( '<x:GetProcessStepsRequest xmlns:x="urn:x">'
+            ...       '<x:ProblemNumber>42</x:ProblemNumber>'
+            ...       '<x:ProcessStepId>2</x:ProcessStepId>'
+            ...       '<x:ProcessStepId>1</x:ProcessStepId>'
+            ...       '</x:GetProcessStepsRequest>'
+            ...     )
+            >>> r.key (b)
+            ('{urn:x}GetProcessStepsRequest', '42', None, ('1', '2'))
+        """
+        k = [body.tag]
+        for name in self.keys:
+            k.append (body.findtext ('.//{*}' + name))
+        steps = body.iterfind ('.//{*}ProcessStepId')
+        k.append (tuple (sorted (s.text for s in steps)))
+        return tuple (k)
+    # end def key
+
+    def entries (self, filename):
+        """ Iterate over request/response pairs of a log file """
+        opener = gzip.open if filename.endswith ('.gz') else open
+        with opener (filename, 'rb') as f:
+            entry = None
+            for line in f:
+                if line == b'Request:\n':
+                    if entry:
+                        yield entry
+                    entry = [[], []]
+                    part  = entry [0]
+                elif entry is not None and line == b'Response:\n':
+                    part = entry [1]
+                elif entry is not None:
+                    part.append (line)
+            if entry:
+                yield entry
+    # end def entries
+
+    def load (self, filename):
+        n = skipped = 0
+        for request, response in self.entries (filename):
+            # First line of the response is the HTTP status
+            if not response or b'[200]' not in response [0]:
+                skipped += 1
+                continue
+            response = b''.join (response [1:]).strip ()
+            if self.truncated.search (response) or self.streamed in response:
+                skipped += 1
+                continue
+            try:
+                req = etree.fromstring (b''.join (request).strip ())
+            except etree.XMLSyntaxError:
+                skipped += 1
+                continue
+            body = soap_body (req)
+            if body is None:
+                skipped += 1
+                continue
+            self.responses [self.key (body)] = response
+            n += 1
+        self.log.info \
+            ('Loaded %d responses from %s, skipped %d' % (n, filename, skipped))
+    # end def load
+
+    def get (self, body):
+        return self.responses.get (self.key (body))
+    # end def get
+
+# end class KPM_Recording
+
+class KPM_Stub_Statistics (autosuper):
+
+    def __init__ (self):
+        self.lock     = threading.Lock ()
+        self.start    = monotonic ()
+        self.requests = {}
+        self.injected = {}
+    # end def __init__
+
+    def count (self, op, injected = None):
+        with self.lock:
+            self.requests [op] = self.requests.get (op, 0) + 1
+            if injected:
+                self.injected [injected] = self.injected.get (injected, 0) + 1
+    # end def count
+
+    def __str__ (self):
+        duration = monotonic () - self.start
+        total    = sum (self.requests.values ())
+        r = [ '%d requests in %.1f seconds (%.1f/s)'
+            % (total, duration, total / max (duration, 1e-3))
+            ]
+        for op in sorted (self.requests):
+            r.append ('%-30s %d' % (op, self.requests [op]))
+        for k in sorted (self.injected):
+            r.append ('Injected %-21s %d' % (k, self.injected [k]))
+        return '\n'.join (r)
+    # end def __str__
+
+# end class KPM_Stub_Statistics
+
+class KPM_Stub_Handler (BaseHTTPRequestHandler):
+
+    fault = \
+        ( b'<soap-env:Envelope '
+          b'xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/">'
+          b'<soap-env:Body><soap-env:Fault>'
+          b'<faultcode>soap-env:Server</faultcode>'
+          b'<faultstring>Injected fault</faultstring>'
+          b'</soap-env:Fault></soap-env:Body></soap-env:Envelope>'
+        )
+
+    def send (self, status, content, ctype = 'text/xml; charset=utf-8'):
+        self.send_response (status)
+        self.send_header ('Content-Type', ctype)
+        self.send_header ('Content-Length', str (len (content)))
+        self.end_headers ()
+        self.wfile.write (content)
+    # end def send
+
+    def do_GET (self):
+        content = self.server.get_file (self.path)
+        if content is None:
+            self.send_response (404)
+            self.end_headers ()
+            return
+        self.send (200, content)
+    # end def do_GET
+
+    def do_POST (self):
+        srv  = self.server
+        n    = int (self.headers.get ('Content-Length', 0))
+        body = self.rfile.read (n)
+        srv.delay ()
+        try:
+            env = etree.fromstring (body)
+        except etree.XMLSyntaxError:
+            self.send (400, b'')
+            return
+        op, content = srv.respond (env)
+        injected = srv.inject ()
+        srv.stats.count (op, injected)
+        if injected == 'drop':
+            self.close_connection = True
+            return
+        if injected == 'fault':
+            self.send (500, self.fault)
+            return
+        if injected == 'error':
+            content = srv.error_response (env)
+        if content is None:
+            self.send (500, self.fault)
+            return
+        self.send (200, content)
+    # end def do_POST
+
+    def log_message (self, format, *args):
+        self.server.log.debug ('KPM stub: ' + format % args)
+    # end def log_message
+
+# end class KPM_Stub_Handler
+
+class KPM_Stub_Server (ThreadingHTTPServer, autosuper):
+    """ Stand-in for the KPM web service for load-testing kpmwssync.
+        The WSDL (and schema files in the same directory) are served
+        with the service address pointing to the stub, kpmwssync is run
+        against the stub by setting KPM_WSDL to the url of the stub with
+        '?wsdl' appended. Responses come from the recording (if any)
+        or the synthetic dataset. Each request is delayed by latency
+        plus a random jitter. The given fraction of requests is answered
+        with a SOAP fault (fault_rate), with an error message in the
+        response (error_rate), or the connection is closed without a
+        response (drop_rate).
+    """
+
+    daemon_threads = True
+    address_re     = re.compile \
+        (rb'(<(?:[\w.-]+:)?address\b[^>]*\blocation=")[^"]*(")')
+
+    def __init__ \
+        ( self
+        , address
+        , wsdl
+        , data
+        , log
+        , recording  = None
+        , latency    = 0.0
+        , jitter     = 0.0
+        , fault_rate = 0.0
+        , error_rate = 0.0
+        , drop_rate  = 0.0
+        ):
+        self.wsdl       = wsdl
+        self.data       = data
+        self.log        = log
+        self.recording  = recording
+        self.latency    = latency
+        self.jitter     = jitter
+        self.fault_rate = fault_rate
+        self.error_rate = error_rate
+        self.drop_rate  = drop_rate
+        self.rng        = random.Random ()
+        self.stats      = KPM_Stub_Statistics ()
+        self.client     = Client (wsdl)
+        self.operations = {}
+        for service in self.client.wsdl.services.values ():
+            for port in service.ports.values ():
+                for op in port.binding.all ().values ():
+                    self.operations [op.input.body.qname] = op
+        self.__super.__init__ (address, KPM_Stub_Handler)
+    # end def __init__
+
+    @property
+    def url (self):
+        host, port = self.server_address [:2]
+        return 'http://%s:%s/' % (host, port)
+    # end def url
+
+    def get_file (self, path):
+        """ Serve the WSDL with the service address pointing to us and
+            files (e.g. imported schemas) from the directory of the WSDL.
+        """
+        path = urlsplit (path)
+        dir  = os.path.dirname (os.path.abspath (self.wsdl))
+        if path.query == 'wsdl' or path.path in ('', '/'):
+            fn = os.path.abspath (self.wsdl)
+        else:
+            fn = os.path.normpath (os.path.join (dir, path.path.lstrip ('/')))
+            if not fn.startswith (dir + os.sep):
+                return None
+        try:
+            with open (fn, 'rb') as f:
+                content = f.read ()
+        except EnvironmentError:
+            return None
+        if fn.endswith ('.wsdl') or fn == os.path.abspath (self.wsdl):
+            url = self.url.encode ('ascii')
+            content = self.address_re.sub \
+                (lambda m: m.group (1) + url + m.group (2), content)
+        return content
+    # end def get_file
+
+    def delay (self):
+        t = self.latency
+        if self.jitter:
+            t += self.rng.uniform (0, self.jitter)
+        if t > 0:
+            sleep (t)
+    # end def delay
+
+    def inject (self):
+        """ Return kind of injected error or None """
+        r = self.rng.random ()
+        for kind in 'fault', 'error', 'drop':
+            rate = getattr (self, kind + '_rate')
+            if r < rate:
+                return kind
+            r -= rate
+        return None
+    # end def inject
+
+    def operation (self, env):
+        body = soap_body (env)
+        if body is None:
+            return None, None
+        return body, self.operations.get (body.tag)
+    # end def operation
+
+    def serialize (self, op, response):
+        response = conform (op.output.body.type, response)
+        msg = op.output.serialize (**response)
+        return etree_to_string (msg.content)
+    # end def serialize
+
+    def respond (self, env):
+        """ Return operation name and response content """
+        body, op = self.operation (env)
+        if op is None:
+            self.log.error ('KPM stub: Unknown request')
+            return None, None
+        if self.recording:
+            content = self.recording.get (body)
+            if content is not None:
+                return op.name, content
+        method = getattr (self.data, op.name, None)
+        if method is None:
+            self.log.error ('KPM stub: %s not implemented' % op.name)
+            return op.name, None
+        request = op.input.deserialize (env)
+        return op.name, self.serialize (op, method (request))
+    # end def respond
+
+    def error_response (self, env):
+        body, op = self.operation (env)
+        if op is None:
+            return None
+        return self.serialize (op, self.data.response ('Injected error'))
+    # end def error_response
+
+    def start (self):
+        """ Serve requests in a background thread """
+        t = threading.Thread (target = self.serve_forever, daemon = True)
+        t.start ()
+        return t
+    # end def start
+
+# end class KPM_Stub_Server
+
+def main ():
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "-c", "--config"
+        , help    = "Configuration file of kpmwssync, used for KPM_WSDL"
+        , default = '/etc/trackersync/kpm_ws_config.py'
+        )
+    cmd.add_argument \
+        ( "--change-rate"
+        , help    = "Fraction of problems changed each time the overview "
+                    "is retrieved, default=%(default)s"
+        , type    = float
+        , default = 0.0
+        )
+    cmd.add_argument \
+        ( "--document-size"
+        , help    = "Size of synthetic documents, default=%(default)s"
+        , type    = int
+        , default = 100 * 1024
+        )
+    cmd.add_argument \
+        ( "--documents"
+        , help    = "Number of documents per problem, default=%(default)s"
+        , type    = int
+        , default = 2
+        )
+    cmd.add_argument \
+        ( "--drop-rate"
+        , help    = "Fraction of requests where the connection is closed "
+                    "without response, default=%(default)s"
+        , type    = float
+        , default = 0.0
+        )
+    cmd.add_argument \
+        ( "--error-rate"
+        , help    = "Fraction of requests answered with an error "
+                    "message, default=%(default)s"
+        , type    = float
+        , default = 0.0
+        )
+    cmd.add_argument \
+        ( "--fault-rate"
+        , help    = "Fraction of requests answered with a SOAP fault, "
+                    "default=%(default)s"
+        , type    = float
+        , default = 0.0
+        )
+    cmd.add_argument \
+        ( "--jitter"
+        , help    = "Random additional latency up to this number of "
+                    "seconds, default=%(default)s"
+        , type    = float
+        , default = 0.0
+        )
+    cmd.add_argument \
+        ( "--latency"
+        , help    = "Latency of each request in seconds, "
+                    "default=%(default)s"
+        , type    = float
+        , default = 0.0
+        )
+    cmd.add_argument \
+        ( "--listen"
+        , help    = "Address to listen on, default=%(default)s"
+        , default = 'localhost'
+        )
+    cmd.add_argument \
+        ( "-p", "--port"
+        , help    = "Port to listen on, default=%(default)s"
+        , type    = int
+        , default = 8080
+        )
+    cmd.add_argument \
+        ( "--problems"
+        , help    = "Number of synthetic problems, default=%(default)s"
+        , type    = int
+        , default = 100
+        )
+    cmd.add_argument \
+        ( "-r", "--recording"
+        , help    = "Log file written with --log-xml-to option of "
+                    "kpmwssync, responses are replayed from the log, "
+                    "requests not found in the log are answered from "
+                    "the synthetic data, may be given several times"
+        , action  = 'append'
+        , default = []
+        )
+    cmd.add_argument \
+        ( "--seed"
+        , help    = "Random seed for synthetic data, default=%(default)s"
+        , type    = int
+        , default = 0
+        )
+    cmd.add_argument \
+        ( "--steps"
+        , help    = "Number of process steps per problem, "
+                    "default=%(default)s"
+        , type    = int
+        , default = 5
+        )
+    cmd.add_argument \
+        ( "-v", "--verbose"
+        , help    = "Verbose reporting"
+        , action  = 'store_true'
+        , default = False
+        )
+    cmd.add_argument \
+        ( "-w", "--wsdl"
+        , help    = "Local copy of the KPM WSDL, overrides KPM_WSDL from "
+                    "config, schema files imported by the WSDL are "
+                    "served from the same directory"
+        )
+    opt     = cmd.parse_args ()
+    logging.basicConfig \
+        ( level  = logging.DEBUG if opt.verbose else logging.INFO
+        , format = '%(asctime)s %(message)s'
+        )
+    log  = logging.getLogger ('kpmwsstub')
+    wsdl = opt.wsdl
+    if not wsdl:
+        cfgpath, config = os.path.split (opt.config)
+        config = os.path.splitext (config) [0]
+        cfg  = kpmwssync.Config (path = cfgpath, config = config)
+        wsdl = cfg.KPM_WSDL
+    data = Synthetic_KPM \
+        ( problems      = opt.problems
+        , steps         = opt.steps
+        , documents     = opt.documents
+        , document_size = opt.document_size
+        , change_rate   = opt.change_rate
+        , seed          = opt.seed
+        )
+    recording = None
+    if opt.recording:
+        recording = KPM_Recording (log)
+        for fn in opt.recording:
+            recording.load (fn)
+    server = KPM_Stub_Server \
+        ( (opt.listen, opt.port)
+        , wsdl
+        , data
+        , log
+        , recording  = recording
+        , latency    = opt.latency
+        , jitter     = opt.jitter
+        , fault_rate = opt.fault_rate
+        , error_rate = opt.error_rate
+        , drop_rate  = opt.drop_rate
+        )
+    log.info ('KPM stub listening, use KPM_WSDL = "%s?wsdl"' % server.url)
+    try:
+        server.serve_forever ()
+    except KeyboardInterrupt:
+        pass
+    log.info (str (server.stats))
+# end def main
+
+if __name__ == '__main__':
+    main ()
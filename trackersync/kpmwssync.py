@@ -31,7 +31,18 @@ import os
 import sys
 import requests
 import logging.config
+import logging.handlers
 import logging
+import threading
+import atexit
+import queue
+import gzip
+import shutil
+import re
+import base64
+import hashlib
+import json
+import zeep
 try:
     from urllib.parse   import urlencode, parse_qs
 except ImportError:
@@ -45,12 +56,21 @@ from rsclib.autosuper   import autosuper
 from rsclib.execute     import Lock_Mixin, Log
 from rsclib.Config_File import Config_File
 from rsclib.pycompat    import string_types
+from time               import sleep, monotonic, time
 from uuid               import uuid4
 from collections        import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib         import contextmanager
+from tempfile           import SpooledTemporaryFile
+from io                 import BytesIO
+from itertools          import islice, count
+from requests.adapters  import HTTPAdapter
 
 from zeep               import Client
 from zeep.transports    import Transport
+from zeep.cache         import SqliteCache
 from zeep.helpers       import serialize_object
+from zeep.xsd           import CompoundValue
 from zeep.exceptions    import Fault
 
 from trackersync        import tracker_sync
@@ -75,27 +95,477 @@ def sanitize (s):
     return s.translate (sanitize_dict) 
 # end def sanitize
 
-class Logging_Transport (Transport):
-    def __init__ (self, logname, *args, **kw):
-        self.logfile = open (logname, 'w')
+def serializable (obj):
+    """ Convert the zeep result obj to a json-serializable structure in
+        a single pass. Zeep objects (CompoundValue) are converted
+        directly via their values, so calling serialize_object first
+        is not necessary. We also fix some problems with the data,
+        e.g., the ProblemNumber is numeric which needs to be a string.
+        Dates (and datetimes) are converted to a date string, raw
+        elements are removed.
+    >>> d = dict (ProblemNumber = 42, Rating = ' A ', _raw_elements = [])
+    >>> d ['Steps'] = [dict (ProblemNumber = 23, Date = date (2024, 1, 2))]
+    >>> d ['Sub'] = dict (When = datetime (2024, 3, 4, 5, 6), Rating = None)
+    >>> serializable (d)
+    {'ProblemNumber': '42', 'Rating': 'A', 'Steps': [{'ProblemNumber': '23', 'Date': '2024-01-02'}], 'Sub': {'When': '2024-03-04', 'Rating': None}}
+    """
+    containers = (dict, list, deque, CompoundValue)
+    if not isinstance (obj, containers):
+        return obj
+    result = [obj]
+    stack  = [(result, 0)]
+    # Items on the stack are (container, key) pairs where the value
+    # still needs conversion. Scalars are converted in place, only
+    # dicts and lists are pushed.
+    while stack:
+        container, key = stack.pop ()
+        v = container [key]
+        if isinstance (v, CompoundValue):
+            v = v.__values__
+        if isinstance (v, dict):
+            d = container [key] = {}
+            for k, item in v.items ():
+                if k == '_raw_elements':
+                    continue
+                if k == 'ProblemNumber':
+                    item = str (item)
+                elif k == 'Rating' and item is not None:
+                    item = item.strip ()
+                elif isinstance (item, containers):
+                    stack.append ((d, k))
+                elif isinstance (item, date):
+                    item = item.strftime ('%Y-%m-%d')
+                elif isinstance (item, _Element):
+                    item = str (item)
+                d [k] = item
+        else:
+            l = container [key] = list (v)
+            for n, item in enumerate (l):
+                if isinstance (item, containers):
+                    stack.append ((l, n))
+                elif isinstance (item, date):
+                    l [n] = item.strftime ('%Y-%m-%d')
+                elif isinstance (item, _Element):
+                    l [n] = str (item)
+    return result [0]
+# end def serializable
+
+class Rate_Limit (autosuper):
+    """ Limit the rate of requests over all threads to the given number
+        of requests per second. A rate of None or 0 means no limit.
+    """
+
+    def __init__ (self, rate = None):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock     = threading.Lock ()
+        self.next     = monotonic ()
+    # end def __init__
+
+    def wait (self):
+        if not self.interval:
+            return
+        with self.lock:
+            now   = monotonic ()
+            delay = self.next - now
+            self.next = max (now, self.next) + self.interval
+        if delay > 0:
+            sleep (delay)
+    # end def wait
+
+# end class Rate_Limit
+
+class Base64_Body:
+    """ File-like request body consisting of prefix, base64 encoding of
+        the given binary file, and suffix. The file is encoded in
+        chunks while the request is sent. The length is known in
+        advance so that we can send a Content-Length header.
+        >>> from io import BytesIO
+        >>> b = Base64_Body (b'<Data>', BytesIO (b'x' * 10), 10, b'</Data>')
+        >>> b.chunk_size = 3
+        >>> len (b)
+        29
+        >>> v = b.read (5) + b.read (4) + b.read ()
+        >>> v
+        b'<Data>eHh4eHh4eHh4eA==</Data>'
+        >>> len (v)
+        29
+        >>> b.read (10)
+        b''
+    """
+
+    chunk_size = 3 * 64 * 1024
+
+    def __init__ (self, prefix, file, size, suffix):
+        self.file   = file
+        self.length = len (prefix) + 4 * ((size + 2) // 3) + len (suffix)
+        self.suffix = suffix
+        self.buffer = prefix
+        self.eof    = False
+    # end def __init__
+
+    def __len__ (self):
+        return self.length
+    # end def __len__
+
+    def read (self, size = -1):
+        while not self.eof and (size < 0 or len (self.buffer) < size):
+            chunk = self.file.read (self.chunk_size)
+            # Only the last chunk may have a length not divisible by 3
+            while chunk and len (chunk) % 3:
+                more = self.file.read (3 - len (chunk) % 3)
+                if not more:
+                    break
+                chunk += more
+            if chunk:
+                self.buffer += base64.b64encode (chunk)
+            else:
+                self.buffer += self.suffix
+                self.eof = True
+        if size < 0:
+            size = len (self.buffer)
+        result      = self.buffer [:size]
+        self.buffer = self.buffer [size:]
+        return result
+    # end def read
+
+# end class Base64_Body
+
+class Base64_Decoder:
+    """ Incrementally decode base64 data into a spooled temporary file.
+        >>> d = Base64_Decoder ()
+        >>> for chunk in b'eHh4e', b'Hh4\\neHh', b'4eA=', b'=':
+        ...     d.write (chunk)
+        >>> f = d.close ()
+        >>> d.size
+        10
+        >>> f.read ()
+        b'xxxxxxxxxx'
+    """
+
+    spool_size = 1024 * 1024
+    whitespace = b' \t\r\n'
+
+    def __init__ (self):
+        self.file = SpooledTemporaryFile (max_size = self.spool_size)
+        self.rest = b''
+        self.size = 0
+    # end def __init__
+
+    def write (self, data):
+        data = self.rest + data.translate (None, self.whitespace)
+        n    = len (data) // 4 * 4
+        self.rest = data [n:]
+        if n:
+            self.size += self.file.write (base64.b64decode (data [:n]))
+    # end def write
+
+    def close (self):
+        """ Return file positioned at the start of the decoded data """
+        if self.rest:
+            self.size += self.file.write (base64.b64decode (self.rest))
+            self.rest  = b''
+        self.file.seek (0)
+        return self.file
+    # end def close
+
+# end class Base64_Decoder
+
+class KPM_Transport (Transport):
+    """ Transport that observes a request rate limit.
+        Large base64-encoded Data elements (documents) are streamed:
+        For sending, a file is registered with upload_stream which
+        returns a marker to be used as the Data value, the marker is
+        replaced by the encoded file when sending. When receiving
+        within the download_stream context, the first Data element of
+        the response is decoded into a temporary file while reading the
+        response, the Data element is replaced by a marker which can be
+        resolved into the file with pop_stream. This avoids holding a
+        document in memory several times (raw, base64, XML tree).
+    """
+
+    data_re    = re.compile (rb'<(?:[\w.-]+:)?Data>')
+    chunk_size = 64 * 1024
+    marker_id  = b'kpm-stream:'
+
+    def __init__ (self, *args, rate_limit = None, **kw):
+        self.rate_limit = rate_limit or Rate_Limit ()
+        self.uploads    = {}
+        self.streamlock = threading.Lock ()
+        self.local      = threading.local ()
         return super ().__init__ (*args, **kw)
     # end def __init__
 
+    def marker (self):
+        """ Marker is base64 so that zeep can decode it """
+        m = self.marker_id + uuid4 ().hex.encode ('ascii')
+        return m, base64.b64encode (m)
+    # end def marker
+
+    def upload_stream (self, file, size):
+        """ Register binary file of given size for upload, returns the
+            marker to be used as the value of the Data element.
+        """
+        m, text = self.marker ()
+        with self.streamlock:
+            self.uploads [text] = (file, size)
+        return text.decode ('ascii')
+    # end def upload_stream
+
+    @contextmanager
+    def download_stream (self):
+        """ Context manager: Stream Data of responses in this thread """
+        self.local.stream    = True
+        self.local.downloads = {}
+        try:
+            yield self
+        finally:
+            self.local.stream    = False
+            self.local.downloads = {}
+    # end def download_stream
+
+    def pop_stream (self, data):
+        """ Return file for a marker returned as Data by zeep or None """
+        return self.local.downloads.pop (data, None)
+    # end def pop_stream
+
+    def cancel_upload (self, text):
+        """ Discard registered upload if it was not sent """
+        with self.streamlock:
+            self.uploads.pop (text.encode ('ascii'), None)
+    # end def cancel_upload
+
+    def request_body (self, message):
+        with self.streamlock:
+            for text in self.uploads:
+                idx = message.find (text)
+                if idx >= 0:
+                    break
+            else:
+                return message
+            file, size = self.uploads.pop (text)
+        return Base64_Body \
+            (message [:idx], file, size, message [idx + len (text):])
+    # end def request_body
+
+    def read_response (self, response):
+        """ Read streamed response, decode content of first Data
+            element into a file and replace it by a marker.
+        """
+        content = []
+        decoder = None
+        buf     = b''
+        with response:
+            for chunk in response.iter_content (chunk_size = self.chunk_size):
+                if decoder is None:
+                    buf += chunk
+                    m = self.data_re.search (buf)
+                    if not m:
+                        # Keep possibly incomplete tag at end of buffer
+                        n = buf.rfind (b'<')
+                        if n < 0:
+                            n = len (buf)
+                        content.append (buf [:n])
+                        buf = buf [n:]
+                        continue
+                    content.append (buf [:m.end ()])
+                    decoder = Base64_Decoder ()
+                    chunk   = buf [m.end ():]
+                    buf     = None
+                if buf is None:
+                    idx = chunk.find (b'<')
+                    if idx < 0:
+                        decoder.write (chunk)
+                        continue
+                    decoder.write (chunk [:idx])
+                    m, text = self.marker ()
+                    self.local.downloads [m] = decoder.close ()
+                    content.append (text)
+                    chunk = chunk [idx:]
+                    buf   = b''
+                content.append (chunk)
+        if buf:
+            content.append (buf)
+        response._content = b''.join (content)
+    # end def read_response
+
     def post (self, address, message, headers):
-        self.xml_request = message.decode ('utf-8')
-        print ('Request:', file = self.logfile)
-        print (self.xml_request, file = self.logfile)
-        response = super().post(address, message, headers)
-        self.response = response
-        print ('Response:', file = self.logfile)
-        print (self.response, file = self.logfile)
+        self.rate_limit.wait ()
+        data = self.request_body (message)
+        if not getattr (self.local, 'stream', False):
+            return super ().post (address, data, headers)
+        response = self.session.post \
+            ( address
+            , data    = data
+            , headers = headers
+            , timeout = self.operation_timeout
+            , stream  = True
+            )
+        ctype = response.headers.get ('Content-Type', '')
+        if not ctype.startswith ('multipart/'):
+            self.read_response (response)
+        return response
+    # end def post
+
+# end class KPM_Transport
+
+def gzip_rotator (source, dest):
+    """ Rotator for RotatingFileHandler: compress rotated log file """
+    with open (source, 'rb') as src:
+        with gzip.open (dest, 'wb') as dst:
+            shutil.copyfileobj (src, dst)
+    os.remove (source)
+# end def gzip_rotator
+
+class Soap_Log_Entry:
+    """ A request/response pair to be logged. Decoding, truncation and
+        formatting is deferred until the entry is converted to a string
+        which is done by the log writer thread.
+        >>> class R:
+        ...     status_code = 200
+        ...     content = b'<a><Data>' + b'x' * 20 + b'</Data></a>'
+        ...     def __str__ (self): return '<Response [200]>'
+        >>> e = Soap_Log_Entry (b'<q><ns0:Data>abcdefgh</ns0:Data></q>', R (), 4)
+        >>> print (e)
+        Request:
+        <q><ns0:Data>abcd...[4 more bytes]</ns0:Data></q>
+        Response:
+        <Response [200]>
+        <a><Data>xxxx...[16 more bytes]</Data></a>
+        >>> e = Soap_Log_Entry (b'<q><Data>abcd</Data></q>', R (), 4)
+        >>> print (str (e).split ('\\n') [1])
+        <q><Data>abcd</Data></q>
+    """
+
+    data_re = re.compile (r'(<(?:\w+:)?Data>)([^<]*)(</)')
+
+    def __init__ (self, request, response, data_limit = None):
+        self.request    = request
+        self.response   = response
+        self.data_limit = data_limit
+    # end def __init__
+
+    def truncate (self, text):
+        if not self.data_limit:
+            return text
+        limit = self.data_limit
+        def repl (m):
+            data = m.group (2)
+            if len (data) <= limit:
+                return m.group (0)
+            return '%s%s...[%d more bytes]%s' \
+                % (m.group (1), data [:limit], len (data) - limit, m.group (3))
+        return self.data_re.sub (repl, text)
+    # end def truncate
+
+    def __str__ (self):
+        lines = ['Request:']
+        lines.append (self.truncate (self.request.decode ('utf-8')))
+        lines.append ('Response:')
+        lines.append (str (self.response))
         try:
-            print (self.response.content.decode ('utf-8'), file = self.logfile)
+            lines.append (self.truncate (self.response.content.decode ('utf-8')))
         except UnicodeDecodeError:
-            print ('UTF-8 Decoding of response failed:', file = self.logfile)
-            print (repr (self.response.content), file = self.logfile)
-        self.logfile.flush ()
+            lines.append ('UTF-8 Decoding of response failed:')
+            lines.append (repr (self.response.content))
+        return '\n'.join (lines)
+    # end def __str__
+
+# end class Soap_Log_Entry
+
+class Soap_Queue_Handler (logging.handlers.QueueHandler):
+    """ Queue handler that does *not* format the record in the calling
+        thread, the log entry is formatted by the writer thread.
+    """
+
+    def prepare (self, record):
+        return record
+    # end def prepare
+
+# end class Soap_Queue_Handler
+
+class Logging_Transport (KPM_Transport):
+    """ Log SOAP traffic to logname. The log is written by a background
+        thread, the file is rotated when it exceeds max_bytes (keeping
+        backups old files, gzip-compressed if compress is set). Data
+        elements (documents) are truncated to data_limit characters.
+        With sample = N only every Nth call is logged, sample = 0 logs
+        only failing calls. Failing calls are always logged.
+    """
+
+    message_re = re.compile (rb'<(?:\w+:)?MessageText>([^<]*)<')
+
+    def __init__ \
+        ( self
+        , logname
+        , *args
+        , max_bytes  = 0
+        , backups    = 0
+        , compress   = False
+        , data_limit = None
+        , sample     = 1
+        , **kw
+        ):
+        self.data_limit = data_limit
+        self.sample     = sample
+        self.counter    = count (1)
+        mode    = 'a' if max_bytes else 'w'
+        handler = logging.handlers.RotatingFileHandler \
+            ( logname
+            , mode        = mode
+            , maxBytes    = max_bytes or 0
+            , backupCount = backups or 0
+            , encoding    = 'utf-8'
+            )
+        if compress:
+            handler.namer   = lambda name: name + '.gz'
+            handler.rotator = gzip_rotator
+        handler.setFormatter (logging.Formatter ('%(message)s'))
+        self.logqueue = queue.SimpleQueue ()
+        self.listener = logging.handlers.QueueListener (self.logqueue, handler)
+        self.listener.start ()
+        atexit.register (self.close)
+        self.xml_log = logging.getLogger ('kpm-xml.%s' % id (self))
+        self.xml_log.propagate = False
+        self.xml_log.setLevel (logging.INFO)
+        self.xml_log.addHandler (Soap_Queue_Handler (self.logqueue))
+        return super ().__init__ (*args, **kw)
+    # end def __init__
+
+    def failed (self, response):
+        """ Check if call failed: Either HTTP error (SOAP faults are
+            returned with status 500) or a MessageText not indicating
+            success.
+        """
+        if not response.ok:
+            return True
+        m = self.message_re.search (response.content)
+        if not m:
+            return False
+        txt = m.group (1)
+        return not (b'success' in txt or b'completed with warnings' in txt)
+    # end def failed
+
+    def close (self):
+        """ Write pending log entries and stop the writer thread """
+        if self.listener:
+            self.listener.stop ()
+            self.listener = None
+    # end def close
+
+    def post (self, address, message, headers):
+        n        = next (self.counter)
+        response = super ().post (address, message, headers)
+        self.xml_request = message
+        self.response    = response
+        if  (  self.sample == 1
+            or (self.sample and n % self.sample == 0)
+            or self.failed (response)
+            ):
+            entry = Soap_Log_Entry (message, response, self.data_limit)
+            self.xml_log.info (entry)
         return response
+    # end def post
+
 # end class Logging_Transport
 
 class Process_Steps:
@@ -126,7 +596,14 @@ class Process_Steps:
         , Analysis_All       = dict (latest = True,  history = True)
         )
 
-    def __init__ (self, parent, problem_id, actions):
+    def __init__ (self, parent, problem_id, actions, old_rec = None):
+        """ If old_rec (the record from the last sync) is given, we
+            retrieve only steps not already in old_rec, known steps are
+            reconstructed from old_rec. Process steps are not changed
+            in KPM once created. This is not done for the steps where
+            we keep the latest: We need data for these that is not in
+            the sync db.
+        """
         self.parent       = parent
         self.problem_id   = problem_id
         self.log          = parent.log
@@ -160,19 +637,46 @@ class Process_Steps:
                 if pstype not in latest or latest [pstype] < psid:
                     latest [pstype] = psid
             if pstype in self.step_map:
-                steplist.add (psid)
-        head = parent.header.header ('GetProcessStepsRequest')
-        info = parent.client.service.GetProcessSteps \
-            ( UserAuthentification = parent.auth
-            , ProblemNumber        = problem_id
-            , ProcessStepId        = list (steplist | set (latest.values ()))
-            , _soapheaders         = head
-            )
-        parent.check_error ('GetProcessStepList', info)
-        self.steps = info ['ProcessStep']
+                known = self.known_step (old_rec, psname, ps)
+                if known:
+                    self.steps.append (known)
+                else:
+                    steplist.add (psid)
+        fetch  = steplist | set (latest.values ())
+        nknown = len (self.steps)
+        if fetch or not self.steps:
+            head = parent.header.header ('GetProcessStepsRequest')
+            info = parent.client.service.GetProcessSteps \
+                ( UserAuthentification = parent.auth
+                , ProblemNumber        = problem_id
+                , ProcessStepId        = list (fetch)
+                , _soapheaders         = head
+                )
+            parent.check_error ('GetProcessStepList', info)
+            self.steps.extend (info ['ProcessStep'] or [])
+            self.log.debug \
+                ( "ID %s: %s steps retrieved, %s from sync db"
+                % (problem_id, len (fetch), nknown)
+                )
         self.compute ()
     # end def __init__
 
+    def known_step (self, old_rec, psname, ps):
+        """ Reconstruct process step ps from the last sync if possible
+        """
+        if not old_rec or self.step_keep [psname]['latest']:
+            return None
+        old = old_rec.get (psname, {}).get (str (ps ['ProcessStepId']))
+        if not old or 'content' not in old or 'date' not in old:
+            return None
+        return dict \
+            ( ProcessStepTypeDescription = ps ['ProcessStepTypeDescription']
+            , ProcessStepId              = ps ['ProcessStepId']
+            , CreationDate               = old ['date']
+            , Text                       = old ['content']
+            )
+    # end def known_step
+
     def compute (self):
         for k in self.rev_step_map:
             self.history [k] = []
@@ -199,18 +703,28 @@ class Process_Steps:
 # end class Process_Steps
 
 class Sync_Attribute_KPM_Message (tracker_sync.Sync_Attribute):
+    """ Sync KPM process steps to local messages and local messages
+        starting with prefix to KPM.
+        If incremental is set, only local messages newer than the
+        newest message seen during the last sync are retrieved from
+        the local tracker (if supported by the local tracker). Note
+        that this will not pick up older messages that have been
+        edited to start with the prefix after they were first seen.
+    """
 
     def __init__ \
         ( self
         , prefix           = None
         , local_prefix     = None
         , kpm_process_step = 'Aussage'
+        , incremental      = False
         , ** kw
         ):
         self.__super.__init__ (local_name = None, ** kw)
         self.prefix           = prefix
         self.local_prefix     = local_prefix
         self.kpm_process_step = kpm_process_step
+        self.incremental      = incremental
     # end def __init__
 
     def sync (self, syncer, id, remote_issue):
@@ -223,7 +737,7 @@ class Sync_Attribute_KPM_Message (tracker_sync.Sync_Attribute):
             return
         kpm = remote_issue.kpm
         kpm_attribute = Process_Steps.step_map [self.kpm_process_step]
-        lmsg = syncer.get_messages (id)
+        lmsg = syncer.get_messages (id, incremental = self.incremental)
         # Get previously synced keys
         remote_issue.get_old_message_keys (syncer)
         local_issue = syncer.localissues [id]
@@ -295,6 +809,44 @@ class Config (Config_File):
             # from KPM, so it makes more sense to check up front the
             # size before trying.
             , KPM_MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024 # 10MB
+            # Number of problems retrieved concurrently
+            , KPM_WORKERS             = 1
+            # Maximum number of SOAP requests per second (over all
+            # workers), None means no limit.
+            , KPM_MAX_REQUEST_RATE    = None
+            # Directory for a persistent cache of WSDL and schema
+            # documents imported by the KPM_WSDL, None disables caching
+            , KPM_WSDL_CACHE          = None
+            # If enabled, problems unchanged in the overview are
+            # retrieved fully only after KPM_FULL_REFRESH_DAYS days.
+            # This only works if the KPM overview contains a change
+            # date or status of the problem, problems without these are
+            # always retrieved.
+            , KPM_OVERVIEW_CACHE      = False
+            , KPM_FULL_REFRESH_DAYS   = 7
+            # Directory for caching documents retrieved from KPM, None
+            # disables the cache.
+            , KPM_DOCUMENT_CACHE      = None
+            # Issues no longer in the mailbox are checked with
+            # exponential backoff starting with KPM_REVISIT_DAYS up to
+            # KPM_REVISIT_MAX_DAYS if they do not change. At most
+            # KPM_REVISIT_BUDGET of these are checked per run, None
+            # means no limit.
+            , KPM_REVISIT_DAYS        = 1
+            , KPM_REVISIT_MAX_DAYS    = 64
+            , KPM_REVISIT_BUDGET      = 100
+            # Rotation of the SOAP traffic log (--log-xml-to): Rotate
+            # when exceeding KPM_XML_LOG_MAX_BYTES keeping
+            # KPM_XML_LOG_BACKUPS old logs, optionally gzip compressed.
+            # Document Data is truncated to KPM_XML_LOG_DATA_LIMIT
+            # characters (None: no truncation). With KPM_XML_LOG_SAMPLE
+            # set to N only every Nth call is logged, 0 means log only
+            # failing calls (these are always logged).
+            , KPM_XML_LOG_MAX_BYTES   = 100 * 1024 * 1024 # 100MB
+            , KPM_XML_LOG_BACKUPS     = 5
+            , KPM_XML_LOG_GZIP        = False
+            , KPM_XML_LOG_DATA_LIMIT  = 1024
+            , KPM_XML_LOG_SAMPLE      = 1
             )
     # end def __init__
 
@@ -325,6 +877,7 @@ class KPM_File_Attachment (tracker_sync.File_Attachment):
     def __init__ (self, issue, **kw):
         self.description = self.permission = None
         self._content = self._name = self._type = None
+        self._file    = kw.pop ('file', None)
         for k in 'content', 'name', 'type':
             setattr (self, '_' + k, kw.get (k, None))
             if k in kw:
@@ -338,11 +891,31 @@ class KPM_File_Attachment (tracker_sync.File_Attachment):
 
     @property
     def content (self):
-        if self._content is None:
-            self._get_file ()
-        return self._content
+        """ Note that the content is not cached if it was retrieved
+            as a file, use the open method for retrieving the content
+            without reading it into memory.
+        """
+        f = self.open ()
+        if f is None or self._content is not None:
+            return self._content
+        return f.read ()
     # end def content
 
+    def open (self):
+        """ Return a binary file object positioned at the start of the
+            content or None if the file cannot be retrieved. Don't
+            close the returned file, it is used for further accesses.
+        """
+        if self._content is None and self._file is None:
+            self._get_file ()
+        if self._content is not None:
+            return BytesIO (self._content)
+        if self._file is None:
+            return None
+        self._file.seek (0)
+        return self._file
+    # end def open
+
     @property
     def name (self):
         if self._name is None:
@@ -361,7 +934,10 @@ class KPM_File_Attachment (tracker_sync.File_Attachment):
             self.issue.log.debug ('get_file returns None')
         else:
             self.issue.log.debug ('Got file: %s' % f ['Name'])
-            self._content = f ['Data']
+            if hasattr (f ['Data'], 'read'):
+                self._file    = f ['Data']
+            else:
+                self._content = f ['Data']
             if not self._name:
                 if f ['Suffix']:
                     self._name = '.'.join ((f ['Name'], f ['Suffix']))
@@ -389,6 +965,9 @@ class Problem (tracker_sync.Remote_Issue):
     multilevel = True
 
     File_Attachment_Class = KPM_File_Attachment
+    # Fingerprint from overview and flag if the problem was retrieved
+    # from KPM, see KPM_WS.overview_problem
+    overview = None
 
     def __init__ (self, kpm, rec, canceled = False, raw = False):
         self.kpm         = kpm
@@ -465,7 +1044,13 @@ class Problem (tracker_sync.Remote_Issue):
 
     def attach_file (self, other, name = None):
         self.kpm.log.debug ('Attaching file "%s" to kpm' % other.name)
-        f = self._attach_file (KPM_File_Attachment, other)
+        # Avoid reading the content into memory if the other side
+        # supports streaming
+        if hasattr (other, 'open') and not other.dummy:
+            f = KPM_File_Attachment \
+                (self, name = other.name, type = other.type, file = other.open ())
+        else:
+            f = self._attach_file (KPM_File_Attachment, other)
         if f is None:
             return
         f.create ()
@@ -646,6 +1231,7 @@ class Problem (tracker_sync.Remote_Issue):
     # end def get_old_message_keys
 
     def sync (self, syncer):
+        """ Returns True if the sync was successful """
         syncer.log.info ('Syncing %s' % self.id)
         try:
             syncer.sync (self.id, self)
@@ -654,6 +1240,8 @@ class Problem (tracker_sync.Remote_Issue):
             syncer.log_exception ()
             print ("Error syncing %s" % self.id)
             print_exc ()
+            return False
+        return True
     # end def sync
 
     def update (self, syncer):
@@ -773,11 +1361,351 @@ class Process_Step_Formatter:
 
 # end class Process_Step_Formatter
 
+class Overview_Cache (autosuper):
+    """ Fingerprints of the entries in the GetMultipleProblemData
+        overview by problem number. If the fingerprint of a problem is
+        unchanged since the last successful sync we do not need to
+        retrieve the problem data again, unless the last full retrieval
+        is older than max_age days or full_refresh is set.
+        An entry gets a fingerprint only if it contains one of the
+        change_keys, otherwise a change in KPM would not be visible
+        in the overview. The change_keys are restricted to the given
+        elements of a ProblemReference in the schema, see
+        KPM_WS.response_elements.
+        The cache is persisted in filename by calling save.
+    >>> oc = Overview_Cache \\
+    ...     ('/nonexisting/__overview', elements = ['ProblemNumber'])
+    >>> oc.change_keys
+    ()
+    >>> oc = Overview_Cache ('/nonexisting/__overview')
+    >>> oc.fingerprint (dict (ProblemNumber = 4711)) is None
+    True
+    >>> fp = oc.fingerprint \\
+    ...     (dict (ProblemNumber = 4711, ProblemStatus = '1'))
+    >>> len (fp)
+    64
+    """
+
+    # Candidates, only those present in the schema are used
+    change_keys = \
+        ( 'LastChangeDate', 'LastChangeTime', 'ChangeDate'
+        , 'ProblemStatus', 'Status'
+        )
+
+    def __init__ \
+        ( self
+        , filename
+        , max_age      = 7
+        , full_refresh = False
+        , elements     = None
+        ):
+        if elements is not None:
+            self.change_keys = tuple \
+                (k for k in self.change_keys if k in elements)
+        self.filename     = filename
+        self.max_age      = max_age * 86400
+        self.full_refresh = full_refresh
+        self.lock         = threading.Lock ()
+        self.cache        = {}
+        try:
+            with open (self.filename) as f:
+                self.cache = json.load (f)
+        except (EnvironmentError, ValueError):
+            pass
+    # end def __init__
+
+    def fingerprint (self, pr):
+        """ Fingerprint of overview entry pr, None if pr doesn't
+            contain any of the change_keys.
+        """
+        d = serialize_object (pr)
+        if not any (d.get (k) is not None for k in self.change_keys):
+            return None
+        j = json.dumps (d, sort_keys = True, default = str)
+        return hashlib.sha256 (j.encode ('utf-8')).hexdigest ()
+    # end def fingerprint
+
+    def unchanged (self, id, fp):
+        if self.full_refresh:
+            return False
+        with self.lock:
+            entry = self.cache.get (str (id))
+        if not entry or entry ['fingerprint'] != fp:
+            return False
+        return entry ['fetched'] > time () - self.max_age
+    # end def unchanged
+
+    def update (self, id, fp, fetched):
+        """ Record fingerprint fp after successful sync, fetched is
+            True if the problem data was retrieved from KPM.
+        """
+        id = str (id)
+        with self.lock:
+            entry = self.cache.get (id)
+            if fetched or not entry:
+                self.cache [id] = dict (fingerprint = fp, fetched = time ())
+    # end def update
+
+    def save (self):
+        with self.lock:
+            tmp = self.filename + '.new'
+            with open (tmp, 'w') as f:
+                json.dump (self.cache, f)
+            os.replace (tmp, self.filename)
+    # end def save
+
+# end class Overview_Cache
+
+class Revisit_Schedule (autosuper):
+    """ Schedule for checking issues that are no longer in the KPM
+        mailbox. For each issue we keep the time of the last check and
+        the number of consecutive checks without change. The interval
+        until the next check starts with interval days and doubles
+        with each unchanged check up to max_interval days. The budget
+        limits the number of issues checked per run, most overdue
+        issues first. With full_refresh all issues are due.
+        The schedule is persisted in filename by calling save.
+    """
+
+    def __init__ \
+        ( self
+        , filename
+        , interval     = 1
+        , max_interval = 64
+        , budget       = None
+        , full_refresh = False
+        ):
+        self.filename     = filename
+        self.interval     = interval * 86400
+        self.max_interval = max_interval * 86400
+        self.budget       = budget
+        self.full_refresh = full_refresh
+        self.schedule     = {}
+        try:
+            with open (self.filename) as f:
+                self.schedule = json.load (f)
+        except (EnvironmentError, ValueError):
+            pass
+    # end def __init__
+
+    def next_check (self, id):
+        entry = self.schedule.get (str (id))
+        if not entry:
+            return 0
+        iv = self.interval * 2 ** entry ['unchanged']
+        return entry ['last'] + min (iv, self.max_interval)
+    # end def next_check
+
+    def due (self, ids, now = None):
+        """ Return issues from ids that are due for a check """
+        now = now or time ()
+        if self.full_refresh:
+            return list (ids)
+        due = sorted \
+            ( (id for id in ids if self.next_check (id) <= now)
+            , key = self.next_check
+            )
+        if self.budget is not None:
+            due = due [:self.budget]
+        return due
+    # end def due
+
+    def prune (self, ids):
+        """ Drop issues not in ids (e.g. no longer in the sync db) """
+        ids = set (str (id) for id in ids)
+        for id in list (self.schedule):
+            if id not in ids:
+                del self.schedule [id]
+    # end def prune
+
+    def remove (self, id):
+        """ Issue is in mailbox again """
+        self.schedule.pop (str (id), None)
+    # end def remove
+
+    def update (self, id, fingerprint):
+        """ Record check of issue, fingerprint is used to determine if
+            the issue changed since the last check. Failed checks are
+            recorded with fingerprint None, so they are retried with
+            backoff, too.
+        """
+        id    = str (id)
+        entry = self.schedule.get (id)
+        if entry and entry ['fingerprint'] == fingerprint:
+            entry ['unchanged'] += 1
+            entry ['last']       = time ()
+        else:
+            self.schedule [id] = dict \
+                (fingerprint = fingerprint, unchanged = 0, last = time ())
+    # end def update
+
+    def save (self):
+        tmp = self.filename + '.new'
+        with open (tmp, 'w') as f:
+            json.dump (self.schedule, f)
+        os.replace (tmp, self.filename)
+    # end def save
+
+# end class Revisit_Schedule
+
+class Document_Cache (autosuper):
+    """ Content-addressed cache of documents retrieved from KPM.
+        The content is stored in a file named after its sha256 hash in
+        the given directory, the index maps problem number and document
+        id to the hash, size and metadata of the document. We count the
+        number of bytes retrieved from KPM and from the cache.
+        Documents are passed as binary files (or bytes when adding) to
+        avoid holding them in memory.
+        The index is persisted by calling save, prune removes entries
+        of problems that are gone and content files no longer
+        referenced by the index.
+    >>> import tempfile, shutil
+    >>> d  = tempfile.mkdtemp ()
+    >>> dc = Document_Cache (d)
+    >>> doc = dict (Name = 'n', Suffix = 'txt', AccessRight = 0)
+    >>> doc ['Description'] = 'Test'
+    >>> doc ['Data'] = b'Hello'
+    >>> dc.add ('4711', '1', doc)
+    >>> doc ['Data'] = b'World'
+    >>> dc.add ('4711', '2', doc)
+    >>> dc.add ('4712', '1', doc)
+    >>> dc.save ()
+    >>> Document_Cache (d).get ('4711', '1') ['Data'].read ()
+    b'Hello'
+    >>> dc.prune (['4712'])
+    >>> dc.get ('4711', '1') is None, dc.get ('4712', '1') ['Data'].read ()
+    (True, b'World')
+    >>> len (os.listdir (d))
+    2
+    >>> print (dc)
+    Document cache: 1 hits, 1 misses, 5 bytes from cache, 15 bytes downloaded
+    >>> shutil.rmtree (d)
+    """
+
+    index_name = '__index'
+    properties = ('Name', 'Suffix', 'AccessRight', 'Description')
+    chunk_size = 64 * 1024
+
+    def __init__ (self, directory):
+        self.directory  = directory
+        self.lock       = threading.Lock ()
+        self.index      = {}
+        self.hits       = 0
+        self.misses     = 0
+        self.saved      = 0
+        self.downloaded = 0
+        os.makedirs (self.directory, exist_ok = True)
+        try:
+            with open (os.path.join (self.directory, self.index_name)) as f:
+                self.index = json.load (f)
+        except (EnvironmentError, ValueError):
+            pass
+    # end def __init__
+
+    def key (self, problem_id, doc_id):
+        return '%s/%s' % (problem_id, doc_id)
+    # end def key
+
+    def get (self, problem_id, doc_id):
+        """ Return document as retrieved by GetDocument or None """
+        with self.lock:
+            entry = self.index.get (self.key (problem_id, doc_id))
+        f = None
+        if entry is not None:
+            fn = os.path.join (self.directory, entry ['sha256'])
+            try:
+                f = open (fn, 'rb')
+            except EnvironmentError:
+                pass
+            if f and os.fstat (f.fileno ()).st_size != entry ['size']:
+                f.close ()
+                f = None
+        with self.lock:
+            if f is None:
+                self.misses += 1
+                return None
+            self.hits  += 1
+            self.saved += entry ['size']
+        d = dict ((k, entry [k]) for k in self.properties)
+        d ['Data'] = f
+        return d
+    # end def get
+
+    def add (self, problem_id, doc_id, doc):
+        data = doc ['Data'] or b''
+        if not hasattr (data, 'read'):
+            data = BytesIO (data)
+        h    = hashlib.sha256 ()
+        size = 0
+        tmp  = os.path.join (self.directory, uuid4 ().hex + '.new')
+        with open (tmp, 'wb') as f:
+            for chunk in iter (lambda: data.read (self.chunk_size), b''):
+                h.update (chunk)
+                size += f.write (chunk)
+        data.seek (0)
+        fn = os.path.join (self.directory, h.hexdigest ())
+        if os.path.exists (fn):
+            os.remove (tmp)
+        else:
+            os.replace (tmp, fn)
+        entry = dict ((k, doc [k]) for k in self.properties)
+        entry.update (sha256 = h.hexdigest (), size = size)
+        with self.lock:
+            self.downloaded += size
+            self.index [self.key (problem_id, doc_id)] = entry
+    # end def add
+
+    def prune (self, problem_ids):
+        """ Remove index entries of problems not in problem_ids and all
+            content files not referenced by the index.
+        """
+        ids = set (str (id) for id in problem_ids)
+        with self.lock:
+            for k in list (self.index):
+                if k.split ('/', 1) [0] not in ids:
+                    del self.index [k]
+            used = set (e ['sha256'] for e in self.index.values ())
+            with os.scandir (self.directory) as it:
+                for entry in it:
+                    n = entry.name
+                    if len (n) == 64 and n not in used:
+                        os.remove (entry.path)
+    # end def prune
+
+    def save (self):
+        with self.lock:
+            fn = os.path.join (self.directory, self.index_name)
+            with open (fn + '.new', 'w') as f:
+                json.dump (self.index, f)
+            os.replace (fn + '.new', fn)
+    # end def save
+
+    def __str__ (self):
+        return \
+            ( 'Document cache: %d hits, %d misses, '
+              '%d bytes from cache, %d bytes downloaded'
+            % (self.hits, self.misses, self.saved, self.downloaded)
+            )
+    # end def __str__
+
+# end class Document_Cache
+
 class KPM_WS (Log, Lock_Mixin):
     """ Interactions with the KPM web service interface
     """
     # keys in SupplierResponse in ProcessStep of Type 'Lieferantenaussage'
     supp_status_keys = ('Status', 'ErrorNumber', 'VersionOk', 'DueDate')
+    # Function returning the record of the last sync for a problem id
+    # (or None), used for retrieving only new process steps.
+    old_values = None
+    # Overview_Cache, if set problems with unchanged overview are not
+    # retrieved again but reconstructed from the sync db.
+    overview   = None
+    # Document_Cache, if set documents are retrieved only once
+    documents  = None
+    # Return from lock if the lock is held by another process, see
+    # try_lock
+    lock_wait  = False
 
     def __init__ \
         ( self
@@ -796,6 +1724,7 @@ class KPM_WS (Log, Lock_Mixin):
         self.verbose  = opt.verbose
         self.debug    = opt.debug
         self.dry_run  = dry_run
+        self.workers  = getattr (opt, 'workers', None) or cfg.KPM_WORKERS
         self.session  = requests.Session ()
         if 'log_level' not in kw:
             kw ['log_level'] = getattr (logging, opt.log_level.upper ())
@@ -808,21 +1737,49 @@ class KPM_WS (Log, Lock_Mixin):
             d = dict (pkcs12_filename = cfg.KPM_PKCS12_PATH)
             if cfg.KPM_PKCS12_PASSWORD:
                 d.update (pkcs12_password = cfg.KPM_PKCS12_PASSWORD)
+            # One connection per worker
+            d.update (pool_maxsize = max (self.workers, 10))
             adapter = Pkcs12Adapter (**d)
             prefix = cfg.KPM_SITE
             self.session.mount (prefix, adapter)
         else:
-            self.session.cert = (self.cert, self.key)
+            # No certificate is used with KPM_CERTPATH set to None,
+            # e.g. for testing against kpmwsstub
+            if self.cert:
+                self.session.cert = (self.cert, self.key)
+            if self.workers > 10:
+                adapter = HTTPAdapter (pool_maxsize = self.workers)
+                self.session.mount ('https://', adapter)
+                self.session.mount ('http://', adapter)
+        rate  = Rate_Limit (cfg.KPM_MAX_REQUEST_RATE)
+        cache = cachepath = None
+        if cfg.KPM_WSDL_CACHE:
+            cachepath = self.wsdl_cache_path ()
+            cache     = SqliteCache (path = cachepath, timeout = None)
         if opt.log_xml_to:
             transport = Logging_Transport \
                 ( logname = opt.log_xml_to
                 , session = self.session
                 , operation_timeout = self.timeout
+                , rate_limit = rate
+                , cache = cache
+                , max_bytes  = cfg.KPM_XML_LOG_MAX_BYTES
+                , backups    = cfg.KPM_XML_LOG_BACKUPS
+                , compress   = cfg.KPM_XML_LOG_GZIP
+                , data_limit = cfg.KPM_XML_LOG_DATA_LIMIT
+                , sample     = cfg.KPM_XML_LOG_SAMPLE
                 )
         else:
-            transport = Transport \
-                (session = self.session, operation_timeout = self.timeout)
-        self.client = Client (self.wsdl, transport = transport)
+            transport = KPM_Transport \
+                ( session = self.session
+                , operation_timeout = self.timeout
+                , rate_limit = rate
+                , cache = cache
+                )
+        start = monotonic ()
+        self.transport = transport
+        self.client    = Client (self.wsdl, transport = transport)
+        self.wsdl_load_time = monotonic () - start
         self.client.settings.strict = False
         self.fac    = self.client.type_factory ('ns0')
         self.auth   = self.fac.UserAuthentification \
@@ -838,6 +1795,10 @@ class KPM_WS (Log, Lock_Mixin):
             level   = getattr (logging, opt.file_log_level.upper ())
             handler.setLevel (level)
             self.log.addHandler (handler)
+        self.log.info \
+            ( 'WSDL loaded in %.3f seconds (cache: %s)'
+            % (self.wsdl_load_time, cachepath)
+            )
     # end def __init__
 
     def __iter__ (self):
@@ -856,10 +1817,32 @@ class KPM_WS (Log, Lock_Mixin):
             )
         if self.check_error ('GetMultipleProblemData', info):
             return
-        for pr in info ['ProblemReference']:
-            p = self.get_problem (pr ['ProblemNumber'])
-            if p is not None:
-                yield (p)
+        prs = info ['ProblemReference']
+        if self.workers <= 1:
+            for pr in prs:
+                p = self.overview_problem (pr)
+                if p is not None:
+                    yield (p)
+            return
+        # Retrieve problems concurrently but return them in mailbox
+        # order. We only retrieve a limited number of problems in
+        # advance, the sync of a problem takes time, too.
+        prs = iter (prs)
+        with ThreadPoolExecutor (max_workers = self.workers) as ex:
+            pending = deque \
+                (ex.submit (self.overview_problem, pr)
+                 for pr in islice (prs, 2 * self.workers)
+                )
+            try:
+                while pending:
+                    p = pending.popleft ().result ()
+                    for pr in islice (prs, 1):
+                        pending.append (ex.submit (self.overview_problem, pr))
+                    if p is not None:
+                        yield (p)
+            finally:
+                for f in pending:
+                    f.cancel ()
     # end def __iter__
 
     def check_error (self, rq, msg):
@@ -887,7 +1870,13 @@ class KPM_WS (Log, Lock_Mixin):
             self.log.error \
                 ('No permission to add document for %s' % issue.id)
             return
-        leng = len (doc.content)
+        f = doc.open ()
+        if f is None:
+            self.log.error ('Document %s has no content' % doc.name)
+            return
+        f.seek (0, os.SEEK_END)
+        leng = f.tell ()
+        f.seek (0)
         if leng > self.cfg.KPM_MAX_ATTACHMENT_SIZE:
             self.log.error \
                 ( 'Document %s is too large for KPM (%s > %s)'
@@ -898,19 +1887,24 @@ class KPM_WS (Log, Lock_Mixin):
         name, suffix = os.path.splitext (doc.name)
         # Max len of suffix is 4 and we don't want leading dots
         suffix = suffix.lstrip ('.')[:4]
+        # The Data is encoded while sending the request
+        data   = self.transport.upload_stream (f, leng)
         kpmdoc = self.fac.Document \
             ( AccessRight          = "0"
             , Name                 = name
             , Size                 = leng
             , Suffix               = suffix
-            , Data                 = doc.content
-            )
-        ans = self.client.service.AddDocument \
-            ( UserAuthentification = self.auth
-            , ProblemNumber        = issue.id
-            , Document             = kpmdoc
-            , _soapheaders         = head
+            , Data                 = data
             )
+        try:
+            ans = self.client.service.AddDocument \
+                ( UserAuthentification = self.auth
+                , ProblemNumber        = issue.id
+                , Document             = kpmdoc
+                , _soapheaders         = head
+                )
+        finally:
+            self.transport.cancel_upload (data)
         if self.check_error ('AddDocument', ans):
             return
         doc.id = ans ['DocumentReference']
@@ -1012,19 +2006,34 @@ class KPM_WS (Log, Lock_Mixin):
             self.log.error \
                 ('No permission to retrieve document for %s' % issue.id)
             return
+        doc_id = doc.id
+        if self.documents is not None:
+            d = self.documents.get (issue.id, doc_id)
+            if d is not None:
+                self.log.debug ('Document %s from cache' % doc_id)
+                return d
         head = self.header.header ('GetDocumentRequest')
-        doc  = self.client.service.GetDocument \
-            ( UserAuthentification = self.auth
-            , ProblemNumber        = issue.id
-            , DocumentId           = doc.id
-            , _soapheaders         = head
-            )
+        # The Data is decoded into a temporary file while receiving
+        with self.transport.download_stream ():
+            doc  = self.client.service.GetDocument \
+                ( UserAuthentification = self.auth
+                , ProblemNumber        = issue.id
+                , DocumentId           = doc_id
+                , _soapheaders         = head
+                )
+            if doc ['Document'] is not None:
+                f = self.transport.pop_stream (doc ['Document']['Data'])
+                if f is not None:
+                    doc ['Document']['Data'] = f
         if self.check_error ('GetDocument', doc):
             return
+        if self.documents is not None:
+            self.documents.add (issue.id, doc_id, doc ['Document'])
         return doc ['Document']
     # end def get_file
 
-    def get_problem (self, id, old_rec = None):
+    def get_actions (self, id):
+        """ Get set of allowed actions for problem id, None on error """
         head   = self.header.header ('GetProblemActionsRequest')
         rights = self.client.service.GetProblemActions \
             ( UserAuthentification = self.auth
@@ -1032,8 +2041,14 @@ class KPM_WS (Log, Lock_Mixin):
             , _soapheaders         = head
             )
         if self.check_error ('GetProblemActions', rights):
+            return None
+        return set (rights ['Action'])
+    # end def get_actions
+
+    def get_problem (self, id, old_rec = None):
+        actions = self.get_actions (id)
+        if actions is None:
             return
-        actions = set (rights ['Action'])
         rec = {}
         raw = None
         if 'GET_DEVELOPMENT_PROBLEM_DATA' in actions:
@@ -1046,13 +2061,16 @@ class KPM_WS (Log, Lock_Mixin):
             if self.check_error ('GetDevelopmentProblemData', rec):
                 return
             rec = rec ['DevelopmentProblem']
-            rec = serialize_object (rec)
-            raw = rec.get ('_raw_elements', None)
-            self.make_serializable (rec)
+            if '_raw_elements' in rec:
+                raw = rec ['_raw_elements']
+            rec = serializable (rec)
         elif not old_rec:
             self.log.info ("No right to get problem data for %s" % id)
             return
-        pss = Process_Steps (self, id, actions)
+        known = old_rec
+        if not known and self.old_values:
+            known = self.old_values (id)
+        pss = Process_Steps (self, id, actions, known)
         if not pss and old_rec:
             old_rec ['__readable__'] = False
             return
@@ -1105,30 +2123,43 @@ class KPM_WS (Log, Lock_Mixin):
         return p
     # end def get_problem
 
-    def make_serializable (self, rec):
-        """ This makes the returned data structure serializable (e.g.
-            convert date to string) and fixes some problems with the
-            data, e.g., the ProblemNumber is numeric which needs to be a
-            string.
+    def get_problem_from_sync_db (self, id, old_rec):
+        """ Reconstruct problem from the record of the last sync, only
+            the allowed actions are retrieved from KPM.
+        """
+        actions = self.get_actions (id)
+        if actions is None:
+            return
+        p = Problem (self, old_rec)
+        p.allowed_actions = actions
+        return p
+    # end def get_problem_from_sync_db
+
+    def overview_problem (self, pr):
+        """ Get problem for ProblemReference pr of the overview. If the
+            overview of the problem is unchanged since the last sync,
+            the problem is reconstructed from the sync db. If this
+            fails we retrieve the problem from KPM.
         """
-        for k in rec.keys ():
-            if k == 'ProblemNumber':
-                rec [k] = str (rec [k])
-            elif k == 'Rating' and rec [k] is not None:
-                rec [k] = rec [k].strip ()
-            elif k == '_raw_elements':
-                del rec [k]
-            elif isinstance (rec [k], type ({})):
-                self.make_serializable (rec [k])
-            elif isinstance (rec [k], (list, deque)):
-                r = dict ((n, item) for n, item in enumerate (rec [k]))
-                self.make_serializable (r)
-                rec [k] = list (r [i] for i in sorted (r))
-            elif isinstance (rec [k], date):
-                rec [k] = rec [k].strftime ('%Y-%m-%d')
-            elif isinstance (rec [k], _Element):
-                rec [k] = str (rec [k])
-    # end def make_serializable
+        id = pr ['ProblemNumber']
+        if self.overview is None:
+            return self.get_problem (id)
+        fp = self.overview.fingerprint (pr)
+        if fp is None:
+            return self.get_problem (id)
+        if self.overview.unchanged (id, fp) and self.old_values:
+            old = self.old_values (id)
+            if old:
+                self.log.debug ('Overview of %s unchanged' % id)
+                p = self.get_problem_from_sync_db (id, old)
+                if p is not None:
+                    p.overview = (fp, False)
+                    return p
+        p = self.get_problem (id)
+        if p is not None:
+            p.overview = (fp, True)
+        return p
+    # end def overview_problem
 
     def update (self, problem):
         response_attrs = set \
@@ -1197,10 +2228,127 @@ class KPM_WS (Log, Lock_Mixin):
                 )
     # end def update_supplier_response
 
+    def lock_fail (self):
+        if not self.lock_wait:
+            self.__super.lock_fail ()
+    # end def lock_fail
+
+    def try_lock (self):
+        """ Get the lock if no other instance holds it, return True
+            if we got it. Used by the webhook listener that must not
+            block the polling sync while idle.
+        """
+        if os.path.exists (self.lockfile):
+            return False
+        self.lock_wait = True
+        try:
+            self.lock ()
+        finally:
+            self.lock_wait = False
+        return self.need_unlock
+    # end def try_lock
+
+    def response_elements (self, operation, name):
+        """ Names of the elements of the item name in the response of
+            the given operation according to the WSDL, None if not
+            found.
+        """
+        for service in self.client.wsdl.services.values ():
+            for port in service.ports.values ():
+                op = port.binding.all ().get (operation)
+                if op is None or op.output is None:
+                    continue
+                for n, element in op.output.body.type.elements:
+                    if n == name and hasattr (element.type, 'elements'):
+                        return [k for k, e in element.type.elements]
+        return None
+    # end def response_elements
+
+    def wsdl_cache_path (self):
+        """ The cache is versioned: A changed WSDL or a new version of
+            zeep gets a new cache file.
+        """
+        h = hashlib.sha256 (zeep.__version__.encode ('ascii'))
+        if os.path.exists (self.wsdl):
+            with open (self.wsdl, 'rb') as f:
+                h.update (f.read ())
+        else:
+            h.update (self.wsdl.encode ('utf-8'))
+        fn = 'kpm-wsdl-%s.db' % h.hexdigest () [:16]
+        return os.path.join (self.cfg.KPM_WSDL_CACHE, fn)
+    # end def wsdl_cache_path
+
 # end class KPM_WS
 
 local_trackers = dict (jira = jira_sync.Syncer)
 
+def webhook_sync (kpm, syncer, opt, cfg):
+    """ Instead of polling all KPM issues, listen for Jira webhooks and
+        sync only the issues reported there. Issues already in the sync
+        db are synced with their KPM issue, other issues are checked if
+        they need to be created in KPM.
+        The lock is held only while syncing a batch of due issues, so
+        the polling sync (e.g. from cron) can run in between. Since
+        the polling sync may create KPM issues, the index of local ids
+        is rebuilt for each batch. Issues are removed from the queue
+        only after a successful sync, failed issues are retried after
+        the debounce interval.
+    """
+    fn    = os.path.join (opt.syncdir, '__webhook_queue')
+    queue = jira_sync.Jira_Webhook_Queue (fn, debounce = opt.webhook_debounce)
+    srv   = jira_sync.Jira_Webhook_Server \
+        ( ('', opt.webhook_port)
+        , queue
+        , kpm.log
+        , project_key = opt.project_key
+        , secret      = cfg.get ('JIRA_WEBHOOK_SECRET', None)
+        )
+    srv.start ()
+    kpm.log.info ('Listening for webhooks on port %s' % opt.webhook_port)
+    kpm.unlock ()
+    while True:
+        keys = queue.due ()
+        if not keys or not kpm.try_lock ():
+            sleep (1)
+            continue
+        try:
+            syncer.id_index = None
+            index = syncer.local_id_index ()
+            ok    = []
+            for key in keys:
+                syncer.reinit ()
+                syncer.item_cache.pop (('issue', key), None)
+                try:
+                    rid = index.get (key)
+                    if rid is None:
+                        syncer.sync_new_local_issues \
+                            (lambda x: Problem (kpm, x), dict (key = key))
+                    elif syncer.get_oldvalues (rid):
+                        problem = kpm.get_problem (rid, syncer.oldremote)
+                        if problem is None or problem.id is None:
+                            syncer.log.warn \
+                                ('KPM issue "%s" not found/readable' % rid)
+                        else:
+                            problem.sync (syncer)
+                    ok.append (key)
+                except Exception:
+                    kpm.log_exception ()
+                    kpm.log.error ("Exception while syncing %s" % key)
+                    # Retry after debounce interval
+                    queue.add (key)
+            # Complete deferred creation of KPM issues
+            syncer.flush ()
+            for key in ok:
+                queue.done (key)
+        except Exception:
+            kpm.log_exception ()
+            kpm.log.error ("Exception while syncing webhook issues")
+            for key in keys:
+                queue.add (key)
+        finally:
+            kpm.unlock ()
+# end def webhook_sync
+
 def wstest ():
     cmd = ArgumentParser ()
     cmd.add_argument \
@@ -1261,6 +2409,13 @@ def wstest ():
 
 def main ():
     cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "--bulk-create"
+        , help    = "Create new local issues in batches of this size, "
+                    "0 disables batching, default=%(default)s"
+        , type    = int
+        , default = 0
+        )
     cmd.add_argument \
         ( "-c", "--config"
         , help    = "Configuration file"
@@ -1283,6 +2438,14 @@ def main ():
         , default = 'INFO'
         , choices = ('CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG')
         )
+    cmd.add_argument \
+        ( "--full-refresh"
+        , help    = "Retrieve all KPM problems even if unchanged in the "
+                    "KPM overview, check all issues no longer in the "
+                    "mailbox"
+        , action  = 'store_true'
+        , default = False
+        )
     cmd.add_argument \
         ( "--issue-type"
         , help    = "Issue type of local tracker"
@@ -1387,6 +2550,25 @@ def main ():
                     "dangerous, you should not have two instances of "
                     "kpmsync writing to KPM."
         )
+    cmd.add_argument \
+        ( "-w", "--workers"
+        , help    = "Number of KPM problems retrieved concurrently, "
+                    "default from config KPM_WORKERS"
+        , type    = int
+        )
+    cmd.add_argument \
+        ( "--webhook-debounce"
+        , help    = "Sync issue only if no webhook event arrived for this "
+                    "number of seconds, default=%(default)s"
+        , type    = float
+        , default = 5
+        )
+    cmd.add_argument \
+        ( "--webhook-port"
+        , help    = "Listen for Jira webhooks on this port and sync only "
+                    "issues reported by Jira instead of polling KPM"
+        , type    = int
+        )
     opt       = cmd.parse_args ()
     config    = Config.config
     cfgpath   = Config.path
@@ -1429,6 +2611,34 @@ def main ():
         syncer.check_method (opt.check_method)
         sys.exit (0)
 
+    if opt.webhook_port:
+        return webhook_sync (kpm, syncer, opt, cfg)
+
+    # Retrieve only new process steps
+    kpm.old_values = syncer.compute_oldvalues
+    if cfg.KPM_DOCUMENT_CACHE:
+        kpm.documents = Document_Cache (cfg.KPM_DOCUMENT_CACHE)
+    if cfg.KPM_OVERVIEW_CACHE:
+        kpm.overview = Overview_Cache \
+            ( os.path.join (opt.syncdir, '__overview')
+            , max_age      = cfg.KPM_FULL_REFRESH_DAYS
+            , full_refresh = opt.full_refresh
+            , elements     = kpm.response_elements
+                ('GetMultipleProblemData', 'ProblemReference')
+            )
+        if not kpm.overview.change_keys:
+            kpm.log.warn \
+                ( 'KPM overview contains no change information, '
+                  'overview cache disabled'
+                )
+            kpm.overview = None
+    revisit = Revisit_Schedule \
+        ( os.path.join (opt.syncdir, '__revisit')
+        , interval     = cfg.KPM_REVISIT_DAYS
+        , max_interval = cfg.KPM_REVISIT_MAX_DAYS
+        , budget       = cfg.KPM_REVISIT_BUDGET
+        , full_refresh = opt.full_refresh
+        )
     # First get all *existing* old issues:
     old_issues = dict.fromkeys (syncer.oldsync_iter ())
     nproblems = 0
@@ -1439,17 +2649,27 @@ def main ():
                 problem.apply_old_values \
                     (syncer.compute_oldvalues (problem.id))
                 del old_issues [problem.id]
-            problem.sync (syncer)
+            if problem.sync (syncer) and problem.overview:
+                kpm.overview.update (problem.id, * problem.overview)
+            revisit.remove (problem.id)
             nproblems += 1
-        if old_issues:
+        if kpm.overview is not None:
+            kpm.overview.save ()
+        due = revisit.due (old_issues)
+        if due:
             syncer.log.warn \
-                ('Processing %s issues not found in mailbox' % len (old_issues))
-            for id in old_issues:
-                oldid = syncer.get_oldvalues (id)
-                if not oldid:
-                    syncer.log.error \
-                        ('Cannot get old KPM issue %s/%s' % (oldid, id))
-                else:
+                ( 'Processing %s of %s issues not found in mailbox'
+                % (len (due), len (old_issues))
+                )
+            for id in due:
+                # Every check is recorded, failed ones with fp None
+                fp = None
+                try:
+                    oldid = syncer.get_oldvalues (id)
+                    if not oldid:
+                        syncer.log.error \
+                            ('Cannot get old KPM issue %s/%s' % (oldid, id))
+                        continue
                     problem = kpm.get_problem (id, syncer.oldremote)
                     if problem is None or problem.id is None:
                         syncer.log.warn \
@@ -1466,8 +2686,24 @@ def main ():
                     else:
                         problem.is_assigned = False
                         syncer.log.warn ('Processing KPM issue "%s"' % id)
-                        problem.sync (syncer)
+                        h = hashlib.sha256 \
+                            (problem.as_json ().encode ('utf-8'))
+                        if problem.sync (syncer):
+                            fp = h.hexdigest ()
                         nproblems += 1
+                except Exception:
+                    kpm.log_exception ()
+                    kpm.log.error ("Exception while checking %s" % id)
+                finally:
+                    revisit.update (id, fp)
+        # Issues that left the sync db
+        revisit.prune (old_issues)
+        revisit.save ()
+        # Complete deferred creation of local issues
+        syncer.flush ()
+        if kpm.documents is not None:
+            kpm.documents.prune (syncer.oldsync_iter ())
+            kpm.log.info (str (kpm.documents))
         syncer.sync_new_local_issues (lambda x: Problem (kpm, x))
     except Exception as err:
         kpm.log_exception ()
@@ -1493,6 +2729,10 @@ def main ():
         kpm.unlock ()
     else:
         kpm.log.info ("Synced %d KPM issues" % nproblems)
+    finally:
+        # Keep documents retrieved so far even if sync failed
+        if kpm.documents is not None:
+            kpm.documents.save ()
 # end def main
 
 if __name__ == '__main__':
@@ -29,7 +29,9 @@ from __future__ import unicode_literals
 from __future__ import print_function
 from __future__ import absolute_import
 import os
+import re
 import sys
+import time
 import zipfile
 import shutil
 from argparse           import ArgumentParser
@@ -37,7 +39,6 @@ from datetime           import datetime
 from xml.etree          import ElementTree
 from traceback          import print_exc
 from copy               import copy
-from glob               import glob
 from rsclib.autosuper   import autosuper
 from rsclib.execute     import Lock_Mixin, Log
 from rsclib.Config_File import Config_File
@@ -55,6 +56,187 @@ from trackersync        import tracker_sync
 #from trackersync        import roundup_sync
 from trackersync        import jira_sync
 
+# Multiline fields in PFIFF contain HTML markup. The text of these used
+# to be extracted by serializing the node and re-parsing it with
+# BeautifulSoup (lxml HTML parser), see html_parsed_text. The tables
+# below describe where the HTML parser does something else than
+# keeping the tree: For these cases we still use the slow path.
+html_whitespace = ' \t\n\f\r'
+html_preserve   = set (('pre', 'textarea'))
+html_rcdata     = set (('title', 'textarea'))
+html_void       = set \
+    ( 'area base basefont br col frame hr img input isindex link meta param'
+      .split ()
+    )
+html_special    = set \
+    ( 'body frameset head html iframe noembed noframes plaintext rp rt'
+      ' script style template xmp'
+      .split ()
+    )
+# Not put into the implied body when starting the document
+html_head       = set (('base', 'frame', 'link', 'meta', 'title'))
+# Parent tag -> child tags that implicitly close the parent
+html_autoclose  = dict \
+    ( a        = 'a fieldset table td th'
+    , address  = 'dd dl dt form li ul'
+    , b        = 'center p td th'
+    , big      = 'p'
+    , caption  = 'col colgroup tbody tfoot thead tr'
+    , colgroup = 'colgroup tbody tfoot thead tr'
+    , dd       = 'dt'
+    , dir      = 'dd dl dt form ul'
+    , dl       = 'form li'
+    , dt       = 'dd dl'
+    , font     = 'center td th'
+    , form     = 'form'
+    , h1       = 'fieldset form li p table'
+    , h2       = 'fieldset form li p table'
+    , h3       = 'fieldset form li p table'
+    , h4       = 'fieldset form li p table'
+    , h5       = 'fieldset form li p table'
+    , h6       = 'fieldset form li p table'
+    , i        = 'center p td th'
+    , legend   = 'fieldset'
+    , li       = 'li'
+    , listing  = 'dd dl dt fieldset form li table ul'
+    , menu     = 'dd dl dt form ul'
+    , ol       = 'form'
+    , option   = 'optgroup option'
+    , p        = 'address blockquote caption center col colgroup dd dir div'
+                 ' dl dt fieldset form frameset h1 h2 h3 h4 h5 h6 hr li'
+                 ' listing menu ol p pre table tbody td tfoot th title tr'
+                 ' ul xmp'
+    , pre      = 'dd dl dt fieldset form li table ul'
+    , s        = 'p'
+    , small    = 'p'
+    , span     = 'td th'
+    , strike   = 'p'
+    , tbody    = 'tbody tfoot'
+    , td       = 'tbody td tfoot th tr'
+    , tfoot    = 'tbody'
+    , th       = 'tbody td tfoot th tr'
+    , thead    = 'tbody tfoot'
+    , tr       = 'tbody tfoot tr'
+    , tt       = 'p'
+    , u        = 'p td th'
+    , ul       = 'address form menu pre'
+    )
+html_autoclose  = dict \
+    ((k, set (v.split ())) for k, v in html_autoclose.items ())
+# Character references &#128; to &#159; are interpreted as windows-1252
+html_c1         = {}
+for c in range (0x80, 0xa0):
+    try:
+        html_c1 [c] = bytes ((c,)).decode ('cp1252')
+    except UnicodeDecodeError:
+        pass
+html_c1_re      = re.compile ('[\x80-\x9f]')
+
+def html_parsed_text (node):
+    """ Text of node (including its tail) as rendered by BeautifulSoup
+        with the lxml HTML parser, strings are joined with newline.
+    """
+    et = ElementTree.ElementTree (node)
+    io = BytesIO ()
+    et.write (io)
+    bs = BeautifulSoup (io.getvalue (), "lxml", from_encoding='utf-8')
+    return bs.get_text ('\n')
+# end def html_parsed_text
+
+def _html_string (s, pre):
+    if '\r' in s:
+        s = s.replace ('\r\n', '\n').replace ('\r', '\n')
+    if not pre and not s.strip (html_whitespace):
+        return '\n' if '\n' in s else ' '
+    return s
+# end def _html_string
+
+def _html_strings (node, parent, pre, strings):
+    """ Append strings of node (without its tail) to strings, return
+        False if the HTML parser would restructure the tree.
+    """
+    if not isinstance (node.tag, string_types):
+        return False
+    name = node.tag.lower ()
+    if name in html_special or name in html_autoclose.get (parent, ()):
+        return False
+    if parent is None and name in html_head:
+        return False
+    if name in html_void and (node.text or len (node)):
+        return False
+    if name in html_rcdata and len (node):
+        return False
+    pre = pre or name in html_preserve
+    if node.text:
+        strings.append (_html_string (node.text, pre))
+    for child in node:
+        if not _html_strings (child, name, pre, strings):
+            return False
+        if child.tail:
+            strings.append (_html_string (child.tail, pre))
+    return True
+# end def _html_strings
+
+def html_text (node):
+    """ Text of node (including its tail) computed directly from the
+        tree, same result as html_parsed_text. Returns None if the HTML
+        parser would change the structure of the tree (e.g., a <p>
+        inside a <b> closes the <b>), the caller has to use
+        html_parsed_text in that case.
+    >>> corpus = \\
+    ...     [ '<ISSUE-DESC>Text</ISSUE-DESC>'
+    ...     , '<ISSUE-DESC><P>Line 1</P><P>Line 2</P></ISSUE-DESC>'
+    ...     , '<ISSUE-DESC>a<BR/>b<BR />\\n  c</ISSUE-DESC>'
+    ...     , '<ISSUE-DESC><UL>\\n <LI>one</LI>\\n <LI>two</LI>\\n</UL>'
+    ...       '</ISSUE-DESC>'
+    ...     , '<ISSUE-DESC><P><B>bold</B> <I>it</I>\\t</P></ISSUE-DESC>'
+    ...     , '<ISSUE-DESC>&lt;tag&gt; &amp;amp; \\xe4\\u20ac</ISSUE-DESC>'
+    ...     , '<ISSUE-DESC><PRE>\\n  x\\n\\n  y\\n </PRE>\\n </ISSUE-DESC>'
+    ...     , '<ISSUE-DESC><TABLE><TR><TD>1</TD><TD> </TD></TR>'
+    ...       '</TABLE></ISSUE-DESC>'
+    ...     , '<ISSUE-DESC>a&#13;&#13;\\nb<P>\\r</P></ISSUE-DESC>'
+    ...     , '<ISSUE-DESC><XDOC><LONG-NAME-1>n</LONG-NAME-1>'
+    ...       '</XDOC></ISSUE-DESC>'
+    ...     , '<X><ISSUE-DESC> <P/> </ISSUE-DESC> tail </X>'
+    ...     , '<X><ISSUE-DESC>\\t<DIV>\\xa0</DIV></ISSUE-DESC>\\n </X>'
+    ...     ]
+    >>> nodes = []
+    >>> for c in corpus:
+    ...     n = ElementTree.fromstring (c)
+    ...     nodes.append (n if n.tag == 'ISSUE-DESC' else n [0])
+    >>> for n in nodes:
+    ...     print (repr (html_text (n)))
+    'Text'
+    'Line 1\\nLine 2'
+    'a\\nb\\n\\n  c'
+    '\\n\\none\\n\\n\\ntwo\\n\\n'
+    'bold\\n \\nit\\n '
+    '<tag> &amp; ä€'
+    '\\n  x\\n\\n  y\\n \\n\\n'
+    '1\\n '
+    'a\\n\\nb\\n\\n'
+    'n'
+    ' \\n \\n tail '
+    ' \\n\\xa0\\n\\n'
+    >>> [html_text (n) == html_parsed_text (n) for n in nodes]
+    [True, True, True, True, True, True, True, True, True, True, True, True]
+    >>> n = ElementTree.fromstring ('<D><B>a<P>b</P>\\n</B>c</D>')
+    >>> print (html_text (n))
+    None
+    >>> html_parsed_text (n)
+    'a\\nb\\n\\nc'
+    """
+    strings = []
+    if not _html_strings (node, None, False, strings):
+        return None
+    if node.tail:
+        strings.append (_html_string (node.tail, False))
+    txt = '\n'.join (strings)
+    if html_c1_re.search (txt):
+        txt = txt.translate (html_c1)
+    return txt
+# end def html_text
+
 class Sync_Attribute_Pfiff_Messages (tracker_sync.Sync_Attribute):
     """ Sync local messages to Pfiff. We get the messages from Pfiff and
         only append those that either don't exist or have an updated
@@ -142,6 +324,73 @@ class Config (Config_File):
 
 # end class Config
 
+class Pfiff_Zip (zipfile.ZipFile, autosuper):
+    """ Output .zip of a PFIFF answer. Members with the extension of an
+        already compressed format are stored uncompressed. Members given
+        as a file object are streamed into the archive.
+    >>> io = BytesIO ()
+    >>> z  = Pfiff_Zip (io, 'w')
+    >>> z.writestr ('./1.xml', b'<X/>' * 100)
+    >>> z.write_file ('./1/a.PDF', BytesIO (b'%PDF' * 100))
+    >>> z.write_file ('./1/b.txt', BytesIO (b'b' * 2000))
+    >>> z.writestr ('./2.xml', '<Y>\xe4</Y>')
+    >>> z.close ()
+    >>> z  = zipfile.ZipFile (io)
+    >>> for i in z.infolist ():
+    ...     print (i.filename, i.compress_type, i.file_size)
+    ./1.xml 8 400
+    ./1/a.PDF 0 400
+    ./1/b.txt 8 2000
+    ./2.xml 8 9
+    >>> print (z.testzip ())
+    None
+    >>> z.read ('./2.xml').decode ('utf-8')
+    '<Y>\xe4</Y>'
+    """
+
+    stored_extensions = set \
+        ( '.7z .avi .bz2 .docx .gif .gz .jpeg .jpg .mov .mp3 .mp4 .pdf'
+          ' .png .pptx .rar .tgz .webp .xlsx .xz .zip'
+          .split ()
+        )
+    chunk_size = 1024 * 1024
+
+    def __init__ \
+        (self, file, mode = 'r', compression = zipfile.ZIP_DEFLATED, ** kw):
+        self.__super.__init__ (file, mode, compression, ** kw)
+    # end def __init__
+
+    def write_file (self, name, file):
+        """ Add member name with the content of the given binary file
+            object, the content is not read into memory.
+        """
+        file.seek (0, os.SEEK_END)
+        zinfo = self.zipinfo (name, file.tell ())
+        file.seek (0)
+        with self.open (zinfo, 'w') as f:
+            shutil.copyfileobj (file, f, self.chunk_size)
+    # end def write_file
+
+    def writestr (self, name, data):
+        if isinstance (data, string_types):
+            data = data.encode ('utf-8')
+        self.__super.writestr (self.zipinfo (name, len (data)), data)
+    # end def writestr
+
+    def zipinfo (self, name, size):
+        """ Same defaults as ZipFile.writestr """
+        zinfo = zipfile.ZipInfo (name, time.localtime (time.time ()) [:6])
+        zinfo.compress_type = self.compression
+        zinfo.external_attr = 0o600 << 16
+        zinfo.file_size     = size
+        ext = os.path.splitext (name) [1].lower ()
+        if ext in self.stored_extensions:
+            zinfo.compress_type = zipfile.ZIP_STORED
+        return zinfo
+    # end def zipinfo
+
+# end class Pfiff_Zip
+
 class Pfiff_File_Attachment (tracker_sync.File_Attachment):
 
     def __init__ (self, issue, path, type = 'application/octet-stream', **kw):
@@ -184,6 +433,16 @@ class Pfiff_File_Attachment (tracker_sync.File_Attachment):
         return self._content
     # end def content
 
+    def open (self):
+        """ Return a binary file object positioned at the start of the
+            content, None if there is no content.
+        """
+        content = self.content
+        if content is None:
+            return None
+        return BytesIO (content)
+    # end def open
+
 # end class Pfiff_File_Attachment
 
 class Problem (tracker_sync.Remote_Issue):
@@ -253,191 +512,397 @@ class Problem (tracker_sync.Remote_Issue):
         """ Update remote issue tracker with self.newvalues and
             self.record. Should only be called if self.dirty.
         """
-        now = self.now.strftime (self.pfiff.date_fmt)
-        id  = self.get ('supplier_company_id')
-        xml = ElementTree.Element ('MSR-ISSUE')
-        xml.set ('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
-        xml.set \
-            ('xsi:noNamespaceSchemaLocation', 'PAG_ASAM_ISSUE_SCHEMA_V3.0.xsd')
-
-        cds = ElementTree.SubElement (xml, 'COMPANY-DATAS')
-        cd  = ElementTree.SubElement (cds, 'COMPANY-DATA')
-        ln  = ElementTree.SubElement (cd, 'LONG-NAME')
-        ln.text = self.pfiff.opt.company
-        sn  = ElementTree.SubElement (cd, 'SHORT-NAME')
-        sn.text = self.pfiff.company_short
-
-        cd  = ElementTree.SubElement (cds, 'COMPANY-DATA')
-        ln  = ElementTree.SubElement (cd, 'LONG-NAME')
-        ln.text = self.pfiff.cfg.COMPANY
-        sn  = ElementTree.SubElement (cd, 'SHORT-NAME')
-        sn.text = self.pfiff.cfg.COMPANY_SHORT
-
-        sname  = self.get ('assignee_key', 'unknown')
-        ts  = ElementTree.SubElement (cd, 'TEAM-MEMBERS')
-        tm  = ElementTree.SubElement (ts, 'TEAM-MEMBER')
-        tm.set ('ID', sname)
-        ln  = ElementTree.SubElement (tm, 'LONG-NAME')
-        ln.text = self.get ('assignee_name', sname)
-        sn  = ElementTree.SubElement (tm, 'SHORT-NAME')
-        sn.text = sname
-        ElementTree.SubElement (tm, 'DEPARTMENT')
-        ElementTree.SubElement (tm, 'PHONE')
-        ElementTree.SubElement (tm, 'FAX')
-        ElementTree.SubElement (tm, 'EMAIL')
-
-        messages = self.get_messages ()
-        authors  = {}
-        for mid in messages:
-            m = messages [mid]
-            authors [m.author_id] = m.author_name
-        for aid in authors:
-            author_name = authors [aid]
-            tm  = ElementTree.SubElement (ts, 'TEAM-MEMBER')
-            tm.set ('ID', aid)
-            ln  = ElementTree.SubElement (tm, 'LONG-NAME')
-            ln.text = author_name
-            sn  = ElementTree.SubElement (tm, 'SHORT-NAME')
-            sn.text = aid
-            ElementTree.SubElement (tm, 'DEPARTMENT')
-            ElementTree.SubElement (tm, 'PHONE')
-            ElementTree.SubElement (tm, 'FAX')
-            ElementTree.SubElement (tm, 'EMAIL')
-
-        ad  = ElementTree.SubElement (xml, 'ADMIN-DATA')
-        ds  = ElementTree.SubElement (ad, 'DOC-REVISIONS')
-        dr  = ElementTree.SubElement (ds, 'DOC-REVISION')
-        tr  = ElementTree.SubElement (dr, 'TEAM-MEMBER-REF')
-        tr.set ('ID-REF', sname)
-        dt  = ElementTree.SubElement (dr, 'DATE')
-        dt.text = self.get ('updated', now)
-
-        issues = ElementTree.SubElement (xml, 'ISSUES')
-        issue  = ElementTree.SubElement (issues, 'ISSUE')
-
-        ln = ElementTree.SubElement (issue, 'LONG-NAME')
-        ln.text = self.get ('problem_synopsis')
-        sn = ElementTree.SubElement (issue, 'SHORT-NAME')
-        sn.text = self.get ('problem_synopsis')
-        cat = ElementTree.SubElement (issue, 'CATEGORY')
-        cat.text = self.get ('bug_classification')
-
-        desc = ElementTree.SubElement (issue, 'ISSUE-DESC')
-        p = ElementTree.SubElement (desc, 'P')
-        p.text = self.get ('problem_description')
-
-        infos   = ElementTree.SubElement (issue, 'COMPANY-ISSUE-INFOS')
-        info    = ElementTree.SubElement (infos, 'COMPANY-ISSUE-INFO')
-        sn      = ElementTree.SubElement (info, 'COMPANY-DATA-REF')
-        sn.text = self.pfiff.cfg.COMPANY_SHORT
-        id_e    = ElementTree.SubElement (info, 'ISSUE-ID')
-        id_e.text = id
-        id_t    = ElementTree.SubElement (info, 'TRANSACTION-ID')
-        id_t.text = self.pfiff.tid + '-' + id
-        info    = ElementTree.SubElement (infos, 'COMPANY-ISSUE-INFO')
-        sn      = ElementTree.SubElement (info, 'COMPANY-DATA-REF')
-        sn.text = self.pfiff.company_short
-        id_e    = ElementTree.SubElement (info, 'ISSUE-ID')
-        id_e.text = self.get ('problem_number')
-
-        props = ElementTree.SubElement (issue, 'ISSUE-PROPERTIES')
-        state = ElementTree.SubElement (props, 'ISSUE-CURRENT-STATE')
-        dt    = ElementTree.SubElement (state, 'DATE')
-        dt.text = self.get ('updated', now)
-        mb    = ElementTree.SubElement (state, 'TEAM-MEMBER-REF')
-        mb.set ('ID-REF', sname)
-        state = ElementTree.SubElement (state, 'ISSUE-STATE')
-        state.text = self.get ('supplier_status')
-        prio  = ElementTree.SubElement (props, 'ISSUE-PRIORITY')
-        prio.text = self.get ('priority')
-        repr  = ElementTree.SubElement (props, 'REPRODUCIBILITY')
-        repr.text = self.get ('reproducibility')
-        mss   = ElementTree.SubElement (props, 'DELIVERY-MILESTONES')
-        lbls  = \
-            ( ('resolve_until_release', 'ESTIMATED')
-            , ('resolved_in_release',    'DELIVERED')
-            )
-        for lbl, cat in lbls:
-            ms    = ElementTree.SubElement (mss,   'DELIVERY-MILESTONE')
-            sl    = ElementTree.SubElement (ms,    'SHORT-LABEL')
-            sl.text = self.get (lbl)
-            ct    = ElementTree.SubElement (ms,    'CATEGORY')
-            ct.text = cat
-            sn    = ElementTree.SubElement (ms,    'COMPANY-DATA-REF')
-            sn.text = self.pfiff.cfg.COMPANY_SHORT
-
-        rds = ElementTree.SubElement (issue, 'ISSUE-RELATED-DOCUMENTS')
+        id    = self.get ('supplier_company_id')
+        files = []
         for f in self.attachments:
             if f.dirty:
-                rd = ElementTree.SubElement (rds, 'ISSUE-RELATED-DOCUMENT')
-                xd = ElementTree.SubElement (rd,  'XDOC')
-                n  = ElementTree.SubElement (xd,  'LONG-NAME')
-                n.text = f.name
-                u  = ElementTree.SubElement (xd,  'URL')
                 fn = './' + id + '/' + f.name
-                u.text = fn
-                self.pfiff.output.writestr (fn, f.content)
+                files.append ((f.name, fn))
+                self.pfiff.output.write_file (fn, f.open ())
                 self.pfiff.out_dirty = True
-
-        env = ElementTree.SubElement (issue, 'ISSUE-ENVIRONMENT')
-        eng = ElementTree.SubElement (env,   'ENGINEERING-OBJECTS')
-
-        for k in self.pfiff.rev_engineering:
-            v = self.get (k)
-            if not v:
-                continue
-            xmlkey = self.pfiff.rev_engineering [k]
-            o = ElementTree.SubElement (eng, 'ENGINEERING-OBJECT')
-            cat = ElementTree.SubElement (o, 'CATEGORY')
-            cat.text = xmlkey
-            sl  = ElementTree.SubElement (o, 'SHORT-LABEL')
-            if xmlkey in ('HARDWARE', 'SOFTWARE', 'PARTNUMBER'):
-                sl.text = 'ECU'
-                rev = ElementTree.SubElement (o, 'REVISION-LABEL')
-                rev.text = v
-            else:
-                sl.text = v
-
-        ri  = ElementTree.SubElement (issue, 'RELATED-ISSUES')
-
-        sos = ElementTree.SubElement (issue, 'ISSUE-SOLUTIONS')
-        so  = ElementTree.SubElement (sos,   'ISSUE-SOLUTION')
-        cat = ElementTree.SubElement (so,    'CATEGORY')
-        cat.text = 'ANALYSIS'
-        dsc = ElementTree.SubElement (so,    'ISSUE-SOLUTION-DESC')
-        p   = ElementTree.SubElement (dsc,   'P')
-        p.text = self.get ('supplier_comments')
-
-        # Annotations should contain Jira comments
-        ans = ElementTree.SubElement (issue, 'ANNOTATIONS')
-        for mid in messages:
-            m   = messages [mid]
-            an  = ElementTree.SubElement (ans, 'ANNOTATION')
-            lbl = ElementTree.SubElement (an, 'LABEL')
-            lbl.text = self.pfiff.cfg.COMPANY_SHORT
-            bm  = ElementTree.SubElement (an, 'TEAM-MEMBER-REF')
-            bm.set ('ID-REF', m.author_id)
-            dt  = ElementTree.SubElement (an, 'DATE')
-            dt.text = m.date.strftime (self.pfiff.date_fmt)
-            at  = ElementTree.SubElement (an, 'ANNOTATION-TEXT')
-            p   = ElementTree.SubElement (at, 'P')
-            p.text = m.content
-
+        if self.pfiff.response is None:
+            self.pfiff.response = Pfiff_Response (self.pfiff)
         fn = './' + id + '.xml'
         self.pfiff.output.writestr \
             ( fn
             , b'<?xml version="1.0" encoding="utf-8"?>\n'
-            + ElementTree.tostring (xml, encoding = 'utf-8')
+            + self.pfiff.response.render (self, files)
             )
         self.pfiff.out_dirty = True
     # end def update
 
 # end def Problem
 
+def xml_escape (text):
+    """ Escape character data like ElementTree does
+    >>> xml_escape ('a < b & c > d "e"')
+    'a &lt; b &amp; c &gt; d "e"'
+    """
+    return text.replace ('&', '&amp;').replace ('<', '&lt;') \
+        .replace ('>', '&gt;')
+# end def xml_escape
+
+def xml_escape_attrib (text):
+    """ Escape attribute value like ElementTree does
+    >>> xml_escape_attrib ('a < b & "c"\\r\\n\\t')
+    'a &lt; b &amp; &quot;c&quot;&#13;&#10;&#09;'
+    """
+    return xml_escape (text).replace ('"', '&quot;') \
+        .replace ('\r', '&#13;').replace ('\n', '&#10;') \
+        .replace ('\t', '&#09;')
+# end def xml_escape_attrib
+
+def xml_element (tag, text):
+    """ Element without attributes and children serialized like
+        ElementTree does.
+    >>> xml_element ('P', 'a < b & c')
+    '<P>a &lt; b &amp; c</P>'
+    >>> xml_element ('P', '')
+    '<P />'
+    """
+    if text:
+        return '<%s>%s</%s>' % (tag, xml_escape (text), tag)
+    return '<%s />' % tag
+# end def xml_element
+
+class Pfiff_Response (autosuper):
+    """ Serializer for the MSR-ISSUE answer of a Problem. This renders
+        the same bytes ElementTree.tostring produces for the document.
+        The parts of the document that are the same for all issues are
+        rendered only once, the per-issue values are escaped like
+        ElementTree does.
+    >>> from rsclib.execute import Log
+    >>> class Cfg:
+    ...     COMPANY       = 'Supplier & Co'
+    ...     COMPANY_SHORT = 'SUP'
+    >>> class Opt:
+    ...     company       = 'OEM <Ltd>'
+    >>> class Fake_Pfiff (Log):
+    ...     cfg             = Cfg
+    ...     opt             = Opt
+    ...     debug           = False
+    ...     company_short   = 'OEM'
+    ...     tid             = '2020-01-01T12'
+    ...     date_fmt        = Pfiff.date_fmt
+    ...     rev_engineering = Pfiff.rev_engineering
+    >>> pf  = Fake_Pfiff ()
+    >>> now = datetime (2020, 1, 1, 12, 0, 0)
+    >>> rec = dict \\
+    ...     ( supplier_company_id = 'S-1'
+    ...     , problem_number      = '4711'
+    ...     , problem_synopsis    = 'Crash "on" <start> & \\xe4'
+    ...     , problem_description = 'Line 1\\nLine 2\\r\\n\\tend'
+    ...     , assignee_key        = 'jd'
+    ...     , assignee_name       = 'J. Doe'
+    ...     , supplier_status     = 'OPEN'
+    ...     , priority            = '1'
+    ...     , resolved_in_release = 'R1'
+    ...     , component_sw_version = '1.0'
+    ...     , vehicle             = 'V & W'
+    ...     , updated             = '2020-01-01T11:00:00'
+    ...     )
+    >>> p1 = Problem (pf, rec, now = now)
+    >>> p1.issue_comments = {}
+    >>> m  = Problem.Message_Class \\
+    ...     ( p1
+    ...     , id          = '1'
+    ...     , author_id   = 'a"b'
+    ...     , author_name = 'A <B>'
+    ...     , date        = now
+    ...     , content     = 'comment & more'
+    ...     )
+    >>> p1.issue_comments [m.id] = m
+    >>> p2 = Problem (pf, dict (supplier_company_id = 'S-2'), now = now)
+    >>> p2.issue_comments = {}
+    >>> files = [('a&b.txt', './S-1/a&b.txt'), ('c.pdf', './S-1/c.pdf')]
+    >>> r = Pfiff_Response (pf)
+
+    The digests are those of the ElementTree serialization of the
+    same documents:
+    >>> import hashlib
+    >>> def digest (p, f):
+    ...     return hashlib.sha256 (r.render (p, f)).hexdigest () [:16]
+    >>> for p, f in ((p1, files), (p2, []), (p1, [])):
+    ...     print (digest (p, f))
+    e1aa05c9ac57b135
+    533ba6a5387b4f46
+    6e699f26d967d9af
+    >>> pf.company_short = 'OEM2'
+    >>> digest (p2, [])
+    '503dbe84e1db31ad'
+    >>> x = r.render (p1, []).decode ('utf-8')
+    >>> print (x [x.index ('<LONG-NAME>Crash'):x.index ('<SHORT-NAME>Crash')])
+    <LONG-NAME>Crash "on" &lt;start&gt; &amp; \xe4</LONG-NAME>
+    >>> x [x.index ('<ISSUE-DESC>'):x.index ('<COMPANY-ISSUE-INFOS>')]
+    '<ISSUE-DESC><P>Line 1\\nLine 2\\r\\n\\tend</P></ISSUE-DESC>'
+
+    Random values with markup characters, whitespace and non-ASCII
+    characters are parsed back unchanged (except for line ends in
+    character data which the parser normalizes):
+    >>> import random
+    >>> rng   = random.Random (42)
+    >>> chars = 'aZ09 <>&"\\'\\r\\n\\t;#\\xe4\\u20ac'
+    >>> def rstr ():
+    ...     return ''.join \\
+    ...         (rng.choice (chars) for i in range (rng.randint (1, 20)))
+    >>> def text (s):
+    ...     return s.replace ('\\r\\n', '\\n').replace ('\\r', '\\n')
+    >>> keys = \\
+    ...     ( 'problem_synopsis', 'problem_description', 'assignee_key'
+    ...     , 'assignee_name', 'supplier_status', 'supplier_comments'
+    ...     )
+    >>> errors = 0
+    >>> for n in range (500):
+    ...     rec = dict ((k, rstr ()) for k in keys)
+    ...     rec ['supplier_company_id'] = str (n)
+    ...     p   = Problem (pf, rec, now = now)
+    ...     p.issue_comments = {}
+    ...     for i in range (rng.randint (0, 3)):
+    ...         m = Problem.Message_Class \\
+    ...             ( p
+    ...             , id          = str (i)
+    ...             , author_id   = rstr ()
+    ...             , author_name = rstr ()
+    ...             , date        = now
+    ...             , content     = rstr ()
+    ...             )
+    ...         p.issue_comments [m.id] = m
+    ...     files = [(rstr (), rstr ()) for i in range (rng.randint (0, 2))]
+    ...     x     = ElementTree.fromstring (r.render (p, files))
+    ...     issue = x.find ('ISSUES/ISSUE')
+    ...     an    = 'ANNOTATIONS/ANNOTATION/'
+    ...     doc   = 'ISSUE-RELATED-DOCUMENTS/ISSUE-RELATED-DOCUMENT/XDOC'
+    ...     got   = \\
+    ...         ( issue.findtext ('LONG-NAME')
+    ...         , issue.findtext ('ISSUE-DESC/P')
+    ...         , x.find ('.//TEAM-MEMBER').get ('ID')
+    ...         , x.findtext ('.//TEAM-MEMBER/LONG-NAME')
+    ...         , issue.findtext ('.//ISSUE-STATE')
+    ...         , issue.findtext ('.//ISSUE-SOLUTION-DESC/P')
+    ...         , [a.get ('ID-REF') for a in issue.iterfind
+    ...             (an + 'TEAM-MEMBER-REF')]
+    ...         , [a.text for a in issue.iterfind (an + 'ANNOTATION-TEXT/P')]
+    ...         , [(d.findtext ('LONG-NAME'), d.findtext ('URL'))
+    ...            for d in issue.iterfind (doc)]
+    ...         )
+    ...     msgs  = p.get_messages ().values ()
+    ...     exp   = \\
+    ...         ( text (rec ['problem_synopsis'])
+    ...         , text (rec ['problem_description'])
+    ...         , rec ['assignee_key']
+    ...         , text (rec ['assignee_name'])
+    ...         , text (rec ['supplier_status'])
+    ...         , text (rec ['supplier_comments'])
+    ...         , [m.author_id for m in msgs]
+    ...         , [text (m.content) for m in msgs]
+    ...         , [(text (a), text (b)) for a, b in files]
+    ...         )
+    ...     errors += got != exp
+    >>> errors
+    0
+    """
+
+    member    = \
+        ( '<TEAM-MEMBER ID="%s">%s%s'
+          '<DEPARTMENT /><PHONE /><FAX /><EMAIL /></TEAM-MEMBER>'
+        )
+    documents = \
+        ( '<ISSUE-RELATED-DOCUMENT><XDOC>%s%s</XDOC>'
+          '</ISSUE-RELATED-DOCUMENT>'
+        )
+    revision  = set (('HARDWARE', 'SOFTWARE', 'PARTNUMBER'))
+
+    def __init__ (self, pfiff):
+        self.pfiff = pfiff
+        self.key   = None
+    # end def __init__
+
+    def compile (self):
+        """ Render the static parts, these depend on the company names
+            and the transaction id.
+        """
+        pfiff = self.pfiff
+        cfg   = pfiff.cfg
+        self.key = \
+            ( pfiff.opt.company, pfiff.company_short
+            , cfg.COMPANY, cfg.COMPANY_SHORT, pfiff.tid
+            )
+        self.head = ''.join \
+            (( '<MSR-ISSUE'
+               ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+               ' xsi:noNamespaceSchemaLocation='
+               '"PAG_ASAM_ISSUE_SCHEMA_V3.0.xsd">'
+               '<COMPANY-DATAS><COMPANY-DATA>'
+             , xml_element ('LONG-NAME',  pfiff.opt.company)
+             , xml_element ('SHORT-NAME', pfiff.company_short)
+             , '</COMPANY-DATA><COMPANY-DATA>'
+             , xml_element ('LONG-NAME',  cfg.COMPANY)
+             , xml_element ('SHORT-NAME', cfg.COMPANY_SHORT)
+             , '<TEAM-MEMBERS>'
+            ))
+        self.cdref   = xml_element ('COMPANY-DATA-REF', cfg.COMPANY_SHORT)
+        self.cdref_o = xml_element ('COMPANY-DATA-REF', pfiff.company_short)
+        self.label   = xml_element ('LABEL', cfg.COMPANY_SHORT)
+        self.milestones = \
+            [ ( lbl
+              , ''.join
+                ( ( xml_element ('CATEGORY', cat)
+                  , self.cdref
+                  , '</DELIVERY-MILESTONE>'
+                ))
+              )
+              for lbl, cat in
+                ( ('resolve_until_release', 'ESTIMATED')
+                , ('resolved_in_release',   'DELIVERED')
+                )
+            ]
+    # end def compile
+
+    def render (self, problem, files):
+        """ Render the answer for problem as utf-8 encoded bytes, files
+            is a list of (name, url) tuples of the attached documents.
+        """
+        pfiff = self.pfiff
+        cfg   = pfiff.cfg
+        key   = \
+            ( pfiff.opt.company, pfiff.company_short
+            , cfg.COMPANY, cfg.COMPANY_SHORT, pfiff.tid
+            )
+        if key != self.key:
+            self.compile ()
+        attr  = xml_escape_attrib
+        get   = problem.get
+        now   = problem.now.strftime (pfiff.date_fmt)
+        id    = get ('supplier_company_id')
+        sname = get ('assignee_key', 'unknown')
+        ref   = '<TEAM-MEMBER-REF ID-REF="%s" />' % attr (sname)
+        date  = xml_element ('DATE', get ('updated', now))
+        r     = [self.head]
+        r.append \
+            ( self.member
+            % ( attr (sname)
+              , xml_element ('LONG-NAME',  get ('assignee_name', sname))
+              , xml_element ('SHORT-NAME', sname)
+              )
+            )
+        messages = problem.get_messages ()
+        authors  = {}
+        for mid in messages:
+            m = messages [mid]
+            authors [m.author_id] = m.author_name
+        for aid in authors:
+            r.append \
+                ( self.member
+                % ( attr (aid)
+                  , xml_element ('LONG-NAME',  authors [aid])
+                  , xml_element ('SHORT-NAME', aid)
+                  )
+                )
+        r.append \
+            ( '</TEAM-MEMBERS></COMPANY-DATA></COMPANY-DATAS>'
+              '<ADMIN-DATA><DOC-REVISIONS><DOC-REVISION>'
+            )
+        r.append (ref)
+        r.append (date)
+        r.append ('</DOC-REVISION></DOC-REVISIONS></ADMIN-DATA>')
+        r.append ('<ISSUES><ISSUE>')
+        r.append (xml_element ('LONG-NAME',  get ('problem_synopsis')))
+        r.append (xml_element ('SHORT-NAME', get ('problem_synopsis')))
+        r.append (xml_element ('CATEGORY',   get ('bug_classification')))
+        r.append ('<ISSUE-DESC>')
+        r.append (xml_element ('P', get ('problem_description')))
+        r.append ('</ISSUE-DESC><COMPANY-ISSUE-INFOS><COMPANY-ISSUE-INFO>')
+        r.append (self.cdref)
+        r.append (xml_element ('ISSUE-ID', id))
+        r.append (xml_element ('TRANSACTION-ID', pfiff.tid + '-' + id))
+        r.append ('</COMPANY-ISSUE-INFO><COMPANY-ISSUE-INFO>')
+        r.append (self.cdref_o)
+        r.append (xml_element ('ISSUE-ID', get ('problem_number')))
+        r.append ('</COMPANY-ISSUE-INFO></COMPANY-ISSUE-INFOS>')
+        r.append ('<ISSUE-PROPERTIES><ISSUE-CURRENT-STATE>')
+        r.append (date)
+        r.append (ref)
+        r.append (xml_element ('ISSUE-STATE', get ('supplier_status')))
+        r.append ('</ISSUE-CURRENT-STATE>')
+        r.append (xml_element ('ISSUE-PRIORITY',  get ('priority')))
+        r.append (xml_element ('REPRODUCIBILITY', get ('reproducibility')))
+        r.append ('<DELIVERY-MILESTONES>')
+        for lbl, tail in self.milestones:
+            r.append ('<DELIVERY-MILESTONE>')
+            r.append (xml_element ('SHORT-LABEL', get (lbl)))
+            r.append (tail)
+        r.append ('</DELIVERY-MILESTONES></ISSUE-PROPERTIES>')
+        if files:
+            r.append ('<ISSUE-RELATED-DOCUMENTS>')
+            for name, url in files:
+                r.append \
+                    ( self.documents
+                    % ( xml_element ('LONG-NAME', name)
+                      , xml_element ('URL',       url)
+                      )
+                    )
+            r.append ('</ISSUE-RELATED-DOCUMENTS>')
+        else:
+            r.append ('<ISSUE-RELATED-DOCUMENTS />')
+        eng = []
+        for k in pfiff.rev_engineering:
+            v = get (k)
+            if not v:
+                continue
+            xmlkey = pfiff.rev_engineering [k]
+            eng.append ('<ENGINEERING-OBJECT>')
+            eng.append (xml_element ('CATEGORY', xmlkey))
+            if xmlkey in self.revision:
+                eng.append ('<SHORT-LABEL>ECU</SHORT-LABEL>')
+                eng.append (xml_element ('REVISION-LABEL', v))
+            else:
+                eng.append (xml_element ('SHORT-LABEL', v))
+            eng.append ('</ENGINEERING-OBJECT>')
+        if eng:
+            r.append ('<ISSUE-ENVIRONMENT><ENGINEERING-OBJECTS>')
+            r.extend (eng)
+            r.append ('</ENGINEERING-OBJECTS></ISSUE-ENVIRONMENT>')
+        else:
+            r.append \
+                ( '<ISSUE-ENVIRONMENT><ENGINEERING-OBJECTS />'
+                  '</ISSUE-ENVIRONMENT>'
+                )
+        r.append \
+            ( '<RELATED-ISSUES /><ISSUE-SOLUTIONS><ISSUE-SOLUTION>'
+              '<CATEGORY>ANALYSIS</CATEGORY><ISSUE-SOLUTION-DESC>'
+            )
+        r.append (xml_element ('P', get ('supplier_comments')))
+        r.append \
+            ('</ISSUE-SOLUTION-DESC></ISSUE-SOLUTION></ISSUE-SOLUTIONS>')
+        if messages:
+            r.append ('<ANNOTATIONS>')
+            for mid in messages:
+                m = messages [mid]
+                r.append ('<ANNOTATION>')
+                r.append (self.label)
+                r.append \
+                    ('<TEAM-MEMBER-REF ID-REF="%s" />' % attr (m.author_id))
+                r.append \
+                    (xml_element ('DATE', m.date.strftime (pfiff.date_fmt)))
+                r.append ('<ANNOTATION-TEXT>')
+                r.append (xml_element ('P', m.content))
+                r.append ('</ANNOTATION-TEXT></ANNOTATION>')
+            r.append ('</ANNOTATIONS>')
+        else:
+            r.append ('<ANNOTATIONS />')
+        r.append ('</ISSUE></ISSUES></MSR-ISSUE>')
+        return ''.join (r).encode ('utf-8')
+    # end def render
+
+# end class Pfiff_Response
+
 class Pfiff (Log, Lock_Mixin):
     """ Represents an export from PFIFF with multiple issues in a .zip
         file. There can be multiple .xml files in a .zip *and* multiple
         issues per .xml
+        The .xml files are parsed incrementally while iterating over
+        the Pfiff object, each issue is discarded after it has been
+        converted to a Problem.
     """
     date_fmt = '%Y/%m/%dT%H:%M:%S'
 
@@ -530,12 +995,14 @@ class Pfiff (Log, Lock_Mixin):
         self.company       = opt.company
         self.company_short = opt.company_short
         self.date          = None
-        self.issues        = []
+        self.xmlnames      = []
+        self.seen          = set ()
         self.path          = []
         self.pudis_no      = 0
         self.pudis         = {}
         self.zf            = None
         self.out_dirty     = False
+        self.response      = None
         self.now           = now
         self.tid           = tid or now.strftime ('%Y-%m-%dT%h:%m:%s')
         if opt.lock_name:
@@ -550,15 +1017,13 @@ class Pfiff (Log, Lock_Mixin):
             else:
                 opt.output = '_out-.zip'
         compression        = zipfile.ZIP_DEFLATED
-        self.output        = zipfile.ZipFile (opt.output, "w", compression)
-        # First read sync db, only issues where remote is not closed are
-        # put in a list
-        # List of not-yet-synced remote ids
-        self.unsynced = {}
-        for rid in syncer.oldsync_iter ():
-            id = syncer.get_oldvalues (rid)
-            if id is not None:
-                self.unsynced [rid] = copy (syncer.oldremote)
+        self.output        = Pfiff_Zip (opt.output, "w", compression)
+        # Remote ids in the sync db, the old values of an issue (and the
+        # check if the local issue still exists) are retrieved on demand
+        # by oldvalues, see there.
+        self.syncer   = syncer
+        self.unsynced = list (syncer.oldsync_iter ())
+        self.synced   = set (self.unsynced)
         if opt.zipfile:
             self.zf = zipfile.ZipFile (opt.zipfile, 'r')
             for n in self.zf.namelist ():
@@ -568,36 +1033,67 @@ class Pfiff (Log, Lock_Mixin):
                 if '/' in fn:
                     continue
                 if fn.endswith ('.xml') or fn.endswith ('.XML'):
-                    self.parse (self.zf.read (n))
-        # We also need to sync the issues that didn't come in the .zip
-        # file: We could have local changes to these issues.
-        for rid in self.unsynced:
-            v = self.unsynced [rid]
-            if 'messages' not in v:
-                v ['messages'] = {}
-            p = Problem (self, v, now = self.now)
-            p.attachments = []
-            for f in v.get ('files', []):
-                pa = Pfiff_File_Attachment \
-                    (p, id = f, name = f, path = f, dummy = True)
-                p.attachments.append (pa)
-            p.issue_comments = {}
-            comments = v.get ('messages', {})
-            for c in comments:
-                rec = copy (comments [c])
-                dt  = datetime.strptime (rec ['date'], self.date_fmt)
-                del rec ['date']
-                m = Problem.Message_Class (p, date = dt, ** rec)
-                p.issue_comments [m.id] = m
-            self.issues.append (p)
+                    self.xmlnames.append (n)
     # end def __init__
 
+    def __iter__ (self):
+        """ Iterate over all issues: First the issues in the .xml files
+            of the .zip, these are read directly from the .zip.
+            We also need to sync the issues that didn't come in the .zip
+            file: We could have local changes to these issues.
+        """
+        self.seen = set ()
+        for n in self.xmlnames:
+            with self.zf.open (n) as f:
+                for p in self.parse (f):
+                    yield p
+        for rid in self.unsynced:
+            if rid not in self.seen:
+                v = self.oldvalues (rid)
+                if v is not None:
+                    yield self.unsynced_problem (v)
+    # end def __iter__
+
+    def oldvalues (self, rid):
+        """ Values of remote issue rid from the last sync, None if rid
+            is not in the sync db or the local issue no longer exists.
+            This is read from the sync db only when needed: Reading it
+            for all issues up front (including a lookup of the local
+            issue) would make startup scale with the number of issues
+            ever synced.
+        """
+        if rid not in self.synced:
+            return None
+        if self.syncer.get_oldvalues (rid) is None:
+            return None
+        return copy (self.syncer.oldremote)
+    # end def oldvalues
+
+    def unsynced_problem (self, v):
+        if 'messages' not in v:
+            v ['messages'] = {}
+        p = Problem (self, v, now = self.now)
+        p.attachments = []
+        for f in v.get ('files', []):
+            pa = Pfiff_File_Attachment \
+                (p, id = f, name = f, path = f, dummy = True)
+            p.attachments.append (pa)
+        p.issue_comments = {}
+        comments = v.get ('messages', {})
+        for c in comments:
+            rec = copy (comments [c])
+            dt  = datetime.strptime (rec ['date'], self.date_fmt)
+            del rec ['date']
+            m = Problem.Message_Class (p, date = dt, ** rec)
+            p.issue_comments [m.id] = m
+        return p
+    # end def unsynced_problem
+
     def as_rendered_html (self, node):
-        et = ElementTree.ElementTree (node)
-        io = BytesIO ()
-        et.write (io)
-        bs = BeautifulSoup (io.getvalue (), "lxml", from_encoding='utf-8')
-        return bs.get_text ('\n')
+        txt = html_text (node)
+        if txt is None:
+            txt = html_parsed_text (node)
+        return txt
     # end def as_rendered_html
 
     def close (self):
@@ -612,75 +1108,98 @@ class Pfiff (Log, Lock_Mixin):
     # end def close
 
     def parse (self, xml):
+        """ Parse xml (a binary file object or bytes) incrementally,
+            yields a Problem for each issue. Only the header (company
+            data and admin data) is kept, each issue is removed from the
+            tree after it is processed.
+        """
         self.team_members = {}
-        tree = ElementTree.fromstring (xml)
-        if tree.tag != 'MSR-ISSUE':
-            raise ValueError ("Invalid xml start-tag: %s" % tree.tag)
-        for cd in tree.findall ('.//COMPANY-DATA'):
-            ln = cd.find ('LONG-NAME')
-            sn = cd.find ('SHORT-NAME')
-            if self.company in ln.text:
-                self.company_short = sn.text.strip ()
-            ts = cd.find ('TEAM-MEMBERS')
-            if ts is not None:
-                for tm in ts:
-                    assert tm.tag == 'TEAM-MEMBER'
-                    id = tm.get ('ID')
-                    ln = tm.find ('LONG-NAME').text.strip ()
-                    ph = tm.find ('PHONE').text.strip ()
-                    em = tm.find ('EMAIL').text.strip ()
-                    self.team_members [id] = ' '.join \
-                        ((ln, 'Phone:', ph, 'email:', em))
-        ad = tree.find ('ADMIN-DATA')
-        dt = ad.find ('.//DATE')
-        self.date = datetime.strptime (dt.text.strip (), self.date_fmt)
-        issues = tree.find ('ISSUES')
-        for issue in issues:
-            self.issue = {}
-            for node in issue:
-                self.parse_a_node (node)
-            att = []
-            if 'attachments' in self.issue:
-                att = self.issue ['attachments']
-                del self.issue ['attachments']
-                self.issue ['files'] = {}
-            number = self.issue ['problem_number']
-            if 'messages' not in self.issue:
-                self.issue ['messages'] = {}
-            p = Problem (self, self.issue, now = self.now)
-            p.attachments = []
-            attold   = {}
-            comments = {}
-            if number in self.unsynced:
-                attold   = self.unsynced [number].get ('files', {})
-                comments = self.unsynced [number].get ('messages', {})
-            p.issue_comments = {}
-            for cid in comments:
-                if cid not in p.record ['messages']:
-                    p.record ['messages'][cid] = comments [cid]
-                rec = copy (comments [cid])
-                dt  = datetime.strptime (rec ['date'], self.date_fmt)
-                del rec ['date']
-                m = Problem.Message_Class (p, date = dt, ** rec)
-                p.issue_comments [m.id] = m
-            for a in att:
-                path, name = a
-                if name in attold:
-                    del attold [name]
-                pa = Pfiff_File_Attachment \
-                    (p, id = path, name = name, path = path)
-                p.attachments.append (pa)
-                p.record ['files'][name] = True
-            for a in attold:
-                pa = Pfiff_File_Attachment \
-                    (p, id = a, name = a, path = a, dummy = True)
-                p.attachments.append (pa)
-                p.record ['files'][a] = True
-            if number in self.unsynced:
-                del self.unsynced [number]
-            self.issues.append (p)
+        if isinstance (xml, bytes):
+            xml = BytesIO (xml)
+        stack = []
+        for event, node in ElementTree.iterparse (xml, ('start', 'end')):
+            if event == 'start':
+                if not stack and node.tag != 'MSR-ISSUE':
+                    raise ValueError ("Invalid xml start-tag: %s" % node.tag)
+                stack.append (node)
+                continue
+            stack.pop ()
+            if node.tag == 'COMPANY-DATA':
+                self.parse_company_data (node)
+            elif node.tag == 'ADMIN-DATA' and len (stack) == 1:
+                dt = node.find ('.//DATE')
+                self.date = datetime.strptime \
+                    (dt.text.strip (), self.date_fmt)
+            elif node.tag == 'ISSUE' and len (stack) == 2:
+                assert stack [-1].tag == 'ISSUES'
+                yield self.parse_issue (node)
+                stack [-1].remove (node)
     # end def parse
 
+    def parse_company_data (self, cd):
+        ln = cd.find ('LONG-NAME')
+        sn = cd.find ('SHORT-NAME')
+        if self.company in ln.text:
+            self.company_short = sn.text.strip ()
+        ts = cd.find ('TEAM-MEMBERS')
+        if ts is not None:
+            for tm in ts:
+                assert tm.tag == 'TEAM-MEMBER'
+                id = tm.get ('ID')
+                ln = tm.find ('LONG-NAME').text.strip ()
+                ph = tm.find ('PHONE').text.strip ()
+                em = tm.find ('EMAIL').text.strip ()
+                self.team_members [id] = ' '.join \
+                    ((ln, 'Phone:', ph, 'email:', em))
+    # end def parse_company_data
+
+    def parse_issue (self, issue):
+        self.issue = {}
+        for node in issue:
+            self.parse_a_node (node)
+        att = []
+        if 'attachments' in self.issue:
+            att = self.issue ['attachments']
+            del self.issue ['attachments']
+            self.issue ['files'] = {}
+        number = self.issue ['problem_number']
+        if 'messages' not in self.issue:
+            self.issue ['messages'] = {}
+        p = Problem (self, self.issue, now = self.now)
+        p.attachments = []
+        attold   = {}
+        comments = {}
+        if number not in self.seen:
+            old = self.oldvalues (number)
+            if old is not None:
+                attold   = copy (old.get ('files', {}))
+                comments = old.get ('messages', {})
+        p.issue_comments = {}
+        for cid in comments:
+            if cid not in p.record ['messages']:
+                p.record ['messages'][cid] = comments [cid]
+            rec = copy (comments [cid])
+            dt  = datetime.strptime (rec ['date'], self.date_fmt)
+            del rec ['date']
+            m = Problem.Message_Class (p, date = dt, ** rec)
+            p.issue_comments [m.id] = m
+        for a in att:
+            path, name = a
+            if name in attold:
+                del attold [name]
+            pa = Pfiff_File_Attachment \
+                (p, id = path, name = name, path = path)
+            p.attachments.append (pa)
+            p.record ['files'][name] = True
+        for a in attold:
+            pa = Pfiff_File_Attachment \
+                (p, id = a, name = a, path = a, dummy = True)
+            p.attachments.append (pa)
+            p.record ['files'][a] = True
+        self.seen.add (number)
+        return p
+    # end def parse_issue
+
     def parse_a_node (self, node):
         self.path.append (node.tag)
         p = '/'.join (self.path)
@@ -817,7 +1336,7 @@ class Pfiff (Log, Lock_Mixin):
     # end def parse_milestone
 
     def sync (self, syncer):
-        for issue in self.issues:
+        for issue in self:
             id = issue.problem_number
             try:
                 syncer.sync (id, issue)
@@ -826,12 +1345,20 @@ class Pfiff (Log, Lock_Mixin):
                 syncer.log_exception ()
                 print ("Error syncing %s" % id)
                 print_exc ()
+        # Complete deferred creation of local issues
+        try:
+            syncer.flush ()
+        except (Exception):
+            syncer.log.error ("Error creating local issues")
+            syncer.log_exception ()
+            print ("Error creating local issues")
+            print_exc ()
         # Todo: implement syncing new local issues
     # end def sync
 
     def __repr__ (self):
         r = []
-        for i in self.issues:
+        for i in self:
             r.append ("ISSUE")
             r.append (repr (i))
         return '\n'.join (r)
@@ -843,6 +1370,96 @@ class Pfiff (Log, Lock_Mixin):
 local_trackers = dict (jira = jira_sync.Syncer)
 lastsync_fmt   = '%Y-%m-%dT%H:%M:%S'
 
+class Engdat_Dir_Index (autosuper):
+    """ Index of the ENGDAT files in a directory, the directory is
+        scanned only once. An ENGDAT file name consists of 'ENG', the
+        package prefix (20 characters including 'ENG'), the number of
+        files in the package (3 digits), the sequence number (3 digits)
+        and an arbitrary rest. Files are grouped by package prefix and
+        by package prefix and sequence number. Changes to the
+        directory made by us must be registered with add, remove and
+        rename. Lookups return full paths like glob.
+    >>> import tempfile
+    >>> d = tempfile.mkdtemp ()
+    >>> pkg = 'ENG18021316111100ABC'
+    >>> for n in ('003001.1', '003002.2', '003003.3', '002001'):
+    ...     open (os.path.join (d, pkg + n), 'w').close ()
+    >>> open (os.path.join (d, 'other'), 'w').close ()
+    >>> idx = Engdat_Dir_Index (d)
+    >>> [os.path.basename (f) for f in idx.package (pkg)]
+    ['ENG18021316111100ABC002001', 'ENG18021316111100ABC003001.1', \
+'ENG18021316111100ABC003002.2', 'ENG18021316111100ABC003003.3']
+    >>> [os.path.basename (f) for f in idx.package (pkg + '002')]
+    ['ENG18021316111100ABC002001']
+    >>> [os.path.basename (f) for f in idx.member (pkg + '003', '002')]
+    ['ENG18021316111100ABC003002.2']
+    >>> old = os.path.join (d, pkg + '002001')
+    >>> idx.rename (old, os.path.join (d, pkg + '009001'))
+    >>> idx.remove (os.path.join (d, pkg + '003002.2'))
+    >>> [os.path.basename (f) for f in idx.package (pkg)]
+    ['ENG18021316111100ABC003001.1', 'ENG18021316111100ABC003003.3', \
+'ENG18021316111100ABC009001']
+    >>> idx.member (pkg + '003', '002')
+    []
+    >>> import shutil
+    >>> shutil.rmtree (d)
+    """
+
+    prefix_len = 20
+
+    def __init__ (self, path):
+        self.path     = path
+        self.packages = {}
+        self.members  = {}
+        with os.scandir (path) as it:
+            for entry in it:
+                self._add (entry.name)
+    # end def __init__
+
+    def add (self, fn):
+        self._add (os.path.basename (fn))
+    # end def add
+
+    def member (self, prefix, seqno):
+        """ Files with given prefix (including number of files in
+            package) and sequence number (as a 3-digit string)
+        """
+        names = self.members.get ((prefix [:23], seqno), ())
+        return sorted (os.path.join (self.path, n) for n in names)
+    # end def member
+
+    def package (self, prefix):
+        """ All files starting with prefix, prefix must contain at
+            least the package prefix.
+        """
+        assert len (prefix) >= self.prefix_len
+        names = self.packages.get (prefix [:self.prefix_len], ())
+        names = (n for n in names if n.startswith (prefix))
+        return sorted (os.path.join (self.path, n) for n in names)
+    # end def package
+
+    def remove (self, fn):
+        name = os.path.basename (fn)
+        self.packages.get (name [:self.prefix_len], set ()).discard (name)
+        self.members.get ((name [:23], name [23:26]), set ()).discard (name)
+    # end def remove
+
+    def rename (self, old, new):
+        self.remove (old)
+        self.add (new)
+    # end def rename
+
+    def _add (self, name):
+        if not name.startswith ('ENG') or len (name) < self.prefix_len:
+            return
+        self.packages.setdefault (name [:self.prefix_len], set ()).add (name)
+        if len (name) >= 26:
+            key = (name [:23], name [23:26])
+            self.members.setdefault (key, set ()).add (name)
+    # end def _add
+
+# end class Engdat_Dir_Index
+
 class Engdat_Sync (autosuper):
 
     def __init__ (self, cfg, opt, syncer):
@@ -852,10 +1469,19 @@ class Engdat_Sync (autosuper):
         self.log    = self.syncer.log
         self.now    = datetime.now ()
         self.outnum = 0
+        self.dir_indices = {}
         self.__super.__init__ ()
         self.log.info ("Engdat sync started")
     # end def __init__
 
+    def dir_index (self, path, rescan = False):
+        """ Engdat_Dir_Index of path, created on first use """
+        path = os.path.normpath (path)
+        if rescan or path not in self.dir_indices:
+            self.dir_indices [path] = Engdat_Dir_Index (path)
+        return self.dir_indices [path]
+    # end def dir_index
+
     def engdat_name (self, outnum = None):
         """ ENGDAT filename without 'ENG' prefix, also used inside engdat
             message.
@@ -883,10 +1509,11 @@ class Engdat_Sync (autosuper):
             belonging to an ENDAT Packet).
         """
         path, rest = os.path.split (fn)
-        pattern = rest [:23] + '*'
-        for f in glob (os.path.join (path, pattern)):
+        index = self.dir_index (path)
+        for f in index.package (rest [:23]):
             self.log.debug ("Unlink: %s" % f)
             os.unlink (f)
+            index.remove (f)
     # end def rm_engdat
 
     def sync (self):
@@ -931,6 +1558,8 @@ class Engdat_Sync (autosuper):
                 flist.append (f)
                 fn = os.path.join (cfg.OFTP_INCOMING, f)
                 shutil.copy (fn, cfg.LOCAL_TMP)
+        # Index the incoming files once, we look up package members there
+        self.dir_index (cfg.LOCAL_TMP, rescan = True)
         # Now loop over tempfiles in LOCAL_TMP, we only use files with
         # sequence number 001 (engdat descriptions) and process these
         self.outnum = 0
@@ -952,6 +1581,7 @@ class Engdat_Sync (autosuper):
             pfiff.sync (self.syncer)
             pfiff.close () # closes .zip file!
             if pfiff.out_dirty:
+                self.dir_index (cfg.LOCAL_OUT_TMP).add (opt.output)
                 self.outname = os.path.join \
                     (cfg.LOCAL_OUT_TMP, 'ENG' + self.engdat_name ())
                 self.write_output (3)
@@ -966,9 +1596,9 @@ class Engdat_Sync (autosuper):
         self.outname = os.path.join \
             (cfg.LOCAL_OUT_TMP, 'ENG' + self.engdat_name ())
         path = os.path.join (cfg.LOCAL_TMP, fn)
-        with open (path) as f:
-            m = Edifact_Message (bytes = f.read ())
-            m.check ()
+        with open (path, 'rb') as f:
+            m = Edifact_Message (file = f)
+        m.check ()
         if m.sde.routing.routing != cfg.ENGDAT_PEER_ROUTING:
             self.log.error \
                 ( "Invalid sender routing: %s expected %s"
@@ -985,10 +1615,11 @@ class Engdat_Sync (autosuper):
             self.rm_engdat (path)
             self.write_lastsync (fn)
             return
+        index = self.dir_index (cfg.LOCAL_TMP)
         for efc in m.segment_iter ('EFC'):
-            gpat  = fn [:23] + "%03d" % int (efc.file_info.seqno) + '*'
-            gpat  = os.path.join (cfg.LOCAL_TMP, gpat)
-            efcfn = glob (gpat)
+            seqno = "%03d" % int (efc.file_info.seqno)
+            gpat  = os.path.join (cfg.LOCAL_TMP, fn [:23] + seqno + '*')
+            efcfn = index.member (fn, seqno)
             if len (efcfn) != 1:
                 raise ValueError ("Sync-file not found, pattern=%s" % gpat)
             efcfn = efcfn [0]
@@ -1011,8 +1642,12 @@ class Engdat_Sync (autosuper):
                 npkg += 1
                 pkg  += 1
             pfiff.close ()
+            if pfiff.out_dirty:
+                self.dir_index (cfg.LOCAL_OUT_TMP).add (opt.output)
             os.unlink (efcfn)
+            index.remove (efcfn)
         os.unlink (path)
+        index.remove (path)
         self.write_lastsync (fn)
         self.write_output (npkg)
     # end def sync_to_remote
@@ -1024,13 +1659,15 @@ class Engdat_Sync (autosuper):
         # files in the resulting engdat pkg. If it's 2 we didn't produce
         # any output files and do not send anything.
         if npkg != 2:
+            index = self.dir_index (cfg.LOCAL_OUT_TMP)
             # Need to rename the files
-            pat = self.outname + '*'
-            for fn in glob (pat):
+            pat = os.path.basename (self.outname)
+            for fn in index.package (pat):
                 d, f = os.path.split (fn)
                 fnew = os.path.join \
                     (d, f [:20] + "%03d" % (npkg - 1) + f [23:])
                 os.rename (fn, fnew)
+                index.rename (fn, fnew)
             em = Engdat_Message \
                 ( sender_id        = cfg.ENGDAT_OWN_ID
                 , sender_name      = cfg.ENGDAT_OWN_NAME
@@ -1059,11 +1696,14 @@ class Engdat_Sync (autosuper):
                 , msgref           = self.engdat_name () [:14]
                 )
             for k in range (2, npkg):
-                em.append_efc ()
-            with open (self.outname + '%03d%03d' % (npkg - 1, 1), "w") as f:
-                f.write (em)
+                em.append_efc (finalize = False)
+            em.finalize ()
+            desc = self.outname + '%03d%03d' % (npkg - 1, 1)
+            with open (desc, "wb") as f:
+                em.write (f)
+            index.add (desc)
             # Now copy the resulting files to the remote OFTP tmp.
-            flist = glob (pat)
+            flist = index.package (pat)
             if ':' in cfg.OFTP_OUTGOING:
                 host1, tmp = cfg.OFTP_TMP_OUT.rsplit (':', 1)
                 host, dir = cfg.OFTP_OUTGOING.rsplit (':', 1)
@@ -1098,6 +1738,7 @@ class Engdat_Sync (autosuper):
                 if not opt.keep_files:
                     for f in flist:
                         os.unlink (f)
+                        index.remove (f)
             else:
                 # Directly move the files to the *local* OFTP_OUTGOING
                 dirperm = os.stat (cfg.OFTP_OUTGOING)
@@ -1108,6 +1749,7 @@ class Engdat_Sync (autosuper):
                         shutil.copy (f, fnew)
                     else:
                         os.rename (f, fnew)
+                        index.remove (f)
                     os.chmod  (fnew, 0o664)
                     os.chown  (fnew, -1, dirperm.st_gid)
     # end def write_output
@@ -1129,6 +1771,13 @@ class Engdat_Sync (autosuper):
 
 def main ():
     cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( "--bulk-create"
+        , help    = "Create new local issues in batches of this size, "
+                    "0 disables batching, default=%(default)s"
+        , type    = int
+        , default = 0
+        )
     cmd.add_argument \
         ( "-c", "--config"
         , help    = "Configuration file"
@@ -218,10 +218,13 @@ class Backend_Common (Log):
         return other_name in self.file_by_name
     # end def file_exists
 
-    def get_messages (self):
+    def get_messages (self, watermark = None):
         """ Returns the dictionary of messages/comments for this issue
             Messages are in a dict by message ID. This allows easier
             deletion of messages.
+            Backends that support incremental retrieval return only
+            messages newer than the given watermark (as stored in the
+            sync db by a previous sync), others may ignore it.
         """
         raise NotImplementedError ("Needs to be implemented in child class")
     # end def
@@ -1412,6 +1415,7 @@ class Trackersync_Syncer (Log):
         self.newcount        = 0
         self.oldremote       = {}
         self.update_state    = False # for migration of old roundup schema
+        self.id_index        = None  # see local_id_index
         self.__super.__init__ (**kw)
         # Override log and do not use the inherited one.
         if 'log' in kw:
@@ -1494,12 +1498,28 @@ class Trackersync_Syncer (Log):
     # end def file_exists
 
     # Don't override in derived class, see Local_Issue
-    def get_messages (self, id):
+    def get_messages (self, id, incremental = False):
+        """ Get messages of local issue. With incremental set, only
+            messages newer than the watermark in the sync db are
+            returned if the backend supports this.
+        """
         if self.get_existing_id (id) is None:
             return {}
+        if incremental:
+            wm = self.message_watermark (id)
+            return self.localissues [id].get_messages (watermark = wm)
         return self.localissues [id].get_messages ()
     # end def get_messages
 
+    def message_watermark (self, id):
+        """ Message watermark from the sync db, only if the current
+            sync status belongs to the local issue with this id.
+        """
+        if str (self.oldremote.get ('__local_id__')) != str (id):
+            return None
+        return self.oldremote.get ('__message_watermark__')
+    # end def message_watermark
+
     def filter (self, classname, searchdict):
         """ Search for all properties in searchdict and return ids of
             found objects.
@@ -1782,19 +1802,51 @@ class Trackersync_Syncer (Log):
                 attr = self.fix_attributes \
                     (self.default_class, classdict [self.default_class], True)
                 self.log_verbose ("Create local (after fixattr):", attr)
-                iid = self.create (self.default_class, ** attr)
-                self.log_info ("created issue: %s/%s" % (iid, remote_id))
                 del classdict [self.default_class]
-                self.current_id = iid
-                # Need to set up localissues for this new id so
-                # that self.get keeps working
-                self.localissues [iid] = self.localissues [id]
-                self.localissues [id].id = iid
-                del self.localissues [id]
+                if self.defer_create \
+                    (id, remote_id, remote_issue, attr, classdict):
+                    return
+                iid = self.create (self.default_class, ** attr)
+                id  = self.created_issue (id, iid, remote_id, remote_issue)
                 self.update_aux_classes \
-                    (iid, remote_id, remote_issue, classdict)
+                    (id, remote_id, remote_issue, classdict)
         elif self.localissues [id].dirty or remote_issue.dirty:
             self.update_issue (id, remote_id, remote_issue)
+        self.update_remote_issue (id, remote_id, remote_issue)
+    # end def sync
+
+    def created_issue (self, id, iid, remote_id, remote_issue):
+        """ Called after the local issue for remote_id was created with
+            the new id iid, id is the temporary (negative) id used during
+            sync. Returns the new id.
+        """
+        self.log_info ("created issue: %s/%s" % (iid, remote_id))
+        self.current_id = iid
+        # Need to set up localissues for this new id so
+        # that self.get keeps working
+        self.localissues [iid] = self.localissues [id]
+        self.localissues [id].id = iid
+        del self.localissues [id]
+        return iid
+    # end def created_issue
+
+    def defer_create (self, id, remote_id, remote_issue, attr, classdict):
+        """ Backends that support creating issues in batches may queue
+            the creation of the local issue and return True. They are
+            then responsible for completing the sync (see sync above)
+            in the flush method.
+        """
+        return False
+    # end def defer_create
+
+    def flush (self):
+        """ Called after all remote issues have been synced. Backends
+            that defer writes (see defer_create) must complete them here.
+        """
+        pass
+    # end def flush
+
+    def update_remote_issue (self, id, remote_id, remote_issue):
         if remote_issue.dirty:
             # Changes to syncdb are written in finalize_sync_db
             if not self.dry_run and not self.remote_dry_run:
@@ -1803,7 +1855,22 @@ class Trackersync_Syncer (Log):
             else:
                 self.log_verbose ("DRYRUN upd remote:", remote_issue.newvalues)
             self.finalize_sync_db (id, remote_id, remote_issue)
-    # end def sync
+    # end def update_remote_issue
+
+    def local_id_index (self):
+        """ Map local ids to remote ids of all issues in the sync db.
+            The sync db is read only once, afterwards the index is
+            kept up to date by update_sync_db.
+        """
+        if self.id_index is None:
+            index = {}
+            for rid in self.oldsync_iter ():
+                d = self.compute_oldvalues (rid)
+                if d and '__local_id__' in d:
+                    index [d ['__local_id__']] = rid
+            self.id_index = index
+        return self.id_index
+    # end def local_id_index
 
     def oldsync_iter (self):
         """ Iterate over all remote ids from previous syncs (all remote
@@ -1861,7 +1928,9 @@ class Trackersync_Syncer (Log):
             Never called if sync_new_local_issues (note the 's') below is
             the default method doing nothing.
         """
-        remote_issue = self.new_remote_issue ({})
+        # Sync status of the previously synced issue must not be used
+        self.oldremote = {}
+        remote_issue   = self.new_remote_issue ({})
         if iid not in self.localissues:
             self.localissues [iid] = self.Local_Issue_Class \
                 (self, iid, opt = self.opt)
@@ -1909,6 +1978,14 @@ class Trackersync_Syncer (Log):
         pass
     # end def sync_new_local_issues
 
+    def sync_db_attributes (self, iid):
+        """ Additional attributes written to the sync db, the local id
+            is needed to find the local issue on next sync. Derived
+            classes may add more.
+        """
+        return dict (__local_id__ = iid)
+    # end def sync_db_attributes
+
     def update_aux_classes (self, id, remote_id, remote_issue, classdict):
         """ Auxiliary classes, e.g. for KPM an item that links to issue
             and holds additional attributes. 
@@ -1944,7 +2021,9 @@ class Trackersync_Syncer (Log):
         """
         fn = self.get_sync_filename (rid)
         with open (fn, "w") as f:
-            f.write (remote_issue.as_json (__local_id__ = iid))
+            f.write (remote_issue.as_json (** self.sync_db_attributes (iid)))
+        if self.id_index is not None:
+            self.id_index [iid] = rid
     # end def update_sync_db
     # This may be different in other implementations, it does a last
     # write of the sync db after remote issues have been sent.